@@ -0,0 +1,57 @@
+'''Measures records/sec of the record emit stage for every stream schema,
+comparing the per-record `singer.Transformer` + `singer.write_record` path
+with the shared RecordEmitter.
+
+    $ python -m benchmarks.bench_emit --records 2000
+'''
+import argparse
+import io
+import sys
+import time
+
+import singer
+
+from benchmarks.synthetic import load_schemas, sample_value
+from tap_pagerduty.output import MessageWriter, RecordEmitter
+
+
+def per_record(stream_name, schema, records):
+    for record in records:
+        with singer.Transformer() as transformer:
+            transformed_record = transformer.transform(data=record, schema=schema)
+            singer.write_record(stream_name=stream_name, time_extracted=singer.utils.now(), record=transformed_record)
+
+
+def emitter(stream_name, schema, records, flush_size):
+    with RecordEmitter(writer=MessageWriter(), stream_name=stream_name, schema=schema, flush_size=flush_size) as record_emitter:
+        for record in records:
+            record_emitter.emit(record)
+
+
+def timed(fn, *args):
+    stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        start = time.perf_counter()
+        fn(*args)
+        return time.perf_counter() - start
+    finally:
+        sys.stdout = stdout
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=1000)
+    parser.add_argument('--flush-size', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'schema':<22} {'per-record rec/s':>18} {'emitter rec/s':>15} {'speedup':>8}")
+    for stream_name, schema in load_schemas().items():
+        records = [sample_value(schema, index=i) for i in range(args.records)]
+        before = args.records / timed(per_record, stream_name, schema, records)
+        after = args.records / timed(emitter, stream_name, schema, records, args.flush_size)
+        print(f"{stream_name:<22} {before:>18.0f} {after:>15.0f} {after / before:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
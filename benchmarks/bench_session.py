@@ -0,0 +1,51 @@
+'''Compares per-call `requests.get` against the tap's shared, pooled session.
+
+    $ python -m benchmarks.bench_session --requests 2000
+'''
+import argparse
+import time
+
+import requests
+
+from benchmarks.mock_server import MockPagerdutyServer
+from tap_pagerduty.session import construct_headers, create_session
+
+
+class CountingServer(MockPagerdutyServer):
+    '''Counts accepted TCP connections, i.e. handshakes paid by the client.'''
+    def __init__(self):
+        super().__init__()
+        server = self.server
+        original_get_request = server.get_request
+
+        def get_request():
+            server.connections += 1
+            return original_get_request()
+        server.get_request = get_request
+
+
+def run(label, fetch, n):
+    with CountingServer() as server:
+        url = f"{server.base_url}/services"
+        start = time.perf_counter()
+        for _ in range(n):
+            fetch(url).raise_for_status()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<16} {n} requests  {elapsed:7.3f}s  {n / elapsed:9.1f} req/s  {server.server.connections} connections")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    args = parser.parse_args()
+
+    config = {"token": "benchmark", "email": "benchmark@example.com"}
+    headers = construct_headers(token=config['token'], email=config['email'])
+    session = create_session(config)
+
+    run('requests.get', lambda url: requests.get(url, headers=headers, params={"limit": 1}), args.requests)
+    run('shared session', lambda url: session.get(url, params={"limit": 1}), args.requests)
+
+
+if __name__ == '__main__':
+    main()
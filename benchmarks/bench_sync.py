@@ -0,0 +1,176 @@
+'''Runs `tap_pagerduty.sync` end to end against the local mock server and
+reports records/sec, requests, wall time and peak memory per scenario.
+
+    $ python -m benchmarks.bench_sync
+    $ python -m benchmarks.bench_sync --scenario incidents --scale 5 --trace-memory
+
+The mock server runs in the same process, so figures include its share
+of CPU and memory. Peak memory is the process' resident set high-water
+mark, which only ever grows, unless `--trace-memory` is given. Python
+allocations are then traced per scenario, at some cost to throughput.
+'''
+import argparse
+import contextlib
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict
+
+import singer
+
+from benchmarks.mock_server import MockPagerdutyServer
+from tap_pagerduty import sync
+from tap_pagerduty.streams import AVAILABLE_STREAMS
+
+UNTIL = '2019-02-01T00:00:00Z'
+
+SCENARIOS: Dict[str, Dict] = {
+    'services': {
+        'streams': ['services', 'escalation_policies'],
+        'server': {'volumes': {'services': 2000, 'escalation_policies': 1000}},
+    },
+    'notifications': {
+        'streams': ['notifications', 'log_entries'],
+        'server': {'volumes': {'notifications': 5000, 'log_entries': 5000}},
+        'config': {'window_size_days': 7},
+    },
+    'incidents': {
+        'streams': ['incidents'],
+        'server': {'volumes': {'incidents': 500}, 'alerts_per_incident': 5, 'log_entries_per_incident': 10},
+    },
+    'incidents-latency': {
+        'streams': ['incidents'],
+        'server': {'volumes': {'incidents': 200}, 'alerts_per_incident': 2, 'log_entries_per_incident': 2,
+                   'latency': 0.02, 'throttle_every': 50},
+    },
+    'incidents-asyncio': {
+        'streams': ['incidents'],
+        'server': {'volumes': {'incidents': 200}, 'alerts_per_incident': 2, 'log_entries_per_incident': 2,
+                   'latency': 0.02, 'throttle_every': 50},
+        'config': {'engine': 'asyncio'},
+    },
+    'incidents-workers': {
+        'streams': ['incidents'],
+        'server': {'volumes': {'incidents': 500}, 'alerts_per_incident': 5, 'log_entries_per_incident': 10},
+        'config': {'transform_workers': 4},
+    },
+    'all-streams': {
+        'streams': ['incidents', 'notifications', 'log_entries', 'services', 'escalation_policies'],
+        'server': {'volumes': {'incidents': 300, 'notifications': 2000, 'log_entries': 2000},
+                   'alerts_per_incident': 3, 'log_entries_per_incident': 5},
+        'config': {'stream_concurrency': 5},
+    },
+}
+
+
+class CountingSink:
+    '''Stands in for stdout, counting the Singer messages written to it.'''
+    def __init__(self):
+        self.lines = 0
+        self.records = 0
+        self.bytes = 0
+
+    def write(self, data: str):
+        self.lines += data.count('\n')
+        self.records += data.count('"type":"RECORD"') + data.count('"type": "RECORD"')
+        self.bytes += len(data)
+
+    def flush(self):
+        pass
+
+
+def build_catalog(config, stream_names):
+    '''Selects the scenario's streams in the entries discovery would write.'''
+    entries = [stream_class.catalog_entry(config) for stream_class in AVAILABLE_STREAMS if stream_class.stream in stream_names]
+    for entry in entries:
+        entry['metadata'] = singer.metadata.to_list(singer.metadata.write(singer.metadata.to_map(entry['metadata']), (), 'selected', True))
+    return singer.catalog.Catalog.from_dict({"streams": entries})
+
+
+def scale_volumes(server_options: Dict, scale: float) -> Dict:
+    options = dict(server_options)
+    options['volumes'] = {key: int(value * scale) for key, value in server_options.get('volumes', {}).items()}
+    return options
+
+
+def run(name: str, scenario: Dict, scale: float, trace_memory: bool) -> Dict:
+    with MockPagerdutyServer(**scale_volumes(scenario['server'], scale)) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        config = {
+            "token": "benchmark",
+            "email": "benchmark@example.com",
+            "since": '2019-01-01T00:00:00Z',
+            "base_url": server.base_url,
+            "requests_per_minute": 10 ** 7,
+            "rate_limit_burst": 10 ** 4,
+            "log_request_metrics": False,
+            "metrics_path": os.path.join(directory, 'metrics.json'),
+            "streams": {
+                "incidents": {"until": UNTIL},
+                "notifications": {"until": UNTIL},
+                "log_entries": {"until": UNTIL},
+            },
+        }
+        config.update(scenario.get('config', {}))
+        catalog = build_catalog(config, scenario['streams'])
+        sink = CountingSink()
+
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sink):
+            sync(config=config, catalog=catalog, state={})
+        elapsed = time.perf_counter() - start
+        if trace_memory:
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            peak_bytes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+        with open(config['metrics_path']) as f:
+            tap_requests = sum(stats['requests'] for stats in json.load(f)['endpoints'].values())
+
+    return {
+        "scenario": name,
+        "records": sink.records,
+        "records_per_second": sink.records / elapsed,
+        "requests": tap_requests,
+        "server_requests": server.requests,
+        "wall_seconds": elapsed,
+        "peak_mb": peak_bytes / 2 ** 20,
+        "output_mb": sink.bytes / 2 ** 20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='May be repeated. Defaults to all.')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplies the record volume of every scenario.')
+    parser.add_argument('--trace-memory', action='store_true')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON lines.')
+    args = parser.parse_args()
+
+    if not args.json:
+        print(f"{'scenario':<20} {'records':>8} {'rec/s':>9} {'requests':>9} {'wall s':>8} {'peak MB':>8} {'out MB':>7}")
+    for name in args.scenario or SCENARIOS:
+        scenario = SCENARIOS[name]
+        if scenario.get('config', {}).get('engine') == 'asyncio':
+            try:
+                import aiohttp  # noqa: F401
+            except ImportError:
+                print(f"{name:<20} skipped, aiohttp is not installed", file=sys.stderr)
+                continue
+        result = run(name, scenario, args.scale, args.trace_memory)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"{name:<20} {result['records']:>8} {result['records_per_second']:>9.0f} {result['requests']:>9} "
+                  f"{result['wall_seconds']:>8.2f} {result['peak_mb']:>8.1f} {result['output_mb']:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+'''A local stand-in for api.pagerduty.com used by the benchmarks.
+
+Listing endpoints serve `volumes[resource]` synthetic records (default
+`per_resource`), shaped after the tap's schemas, with Pagerduty's classic
+offset/limit pagination envelope and `total=true` support. Records of
+time-windowed resources are spread evenly between `start` and
+`start + span` and filtered on `since`/`until`. Every incident has
+`alerts_per_incident` alerts and `log_entries_per_incident` log entries.
+
+`latency` delays every response by that many seconds, and
+`throttle_every` answers every Nth request with a 429 and `Retry-After: 0`.
+'''
+import copy
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.synthetic import load_schemas, sample_value
+
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# The fields a windowed resource is filtered and replicated on.
+TIMESTAMP_KEYS = {
+    'incidents': ('created_at', 'last_status_change_at'),
+    'notifications': ('started_at',),
+    'log_entries': ('created_at',),
+}
+
+
+class MockPagerdutyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Allows clients to keep connections alive.
+    disable_nagle_algorithm = True
+    per_resource = 100
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            throttled = server.throttle_every and server.requests % server.throttle_every == 0
+        if server.latency:
+            time.sleep(server.latency)
+        if throttled:
+            self.send_json({"error": {"message": "Rate Limit Exceeded", "code": 2020}}, status=429, headers={'Retry-After': '0'})
+            return
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path.strip('/').split('/')
+        offset = int(query.get('offset', [0])[0])
+        limit = int(query.get('limit', [100])[0])
+
+        mock = server.mock
+        if len(path) == 3:
+            resource = path[2]
+            total = mock.per_incident.get(resource, 0)
+            records = [mock.record(resource, index, parent_id=path[1]) for index in range(offset, min(offset + limit, total))]
+        else:
+            resource = path[0]
+            indexes = mock.indexes(resource, query)
+            total = len(indexes)
+            records = [mock.record(resource, index) for index in indexes[offset:offset + limit]]
+
+        body = {resource: records, "offset": offset, "limit": limit, "more": offset + limit < total}
+        if query.get('total') == ['true']:
+            body["total"] = total
+        self.send_json(body)
+
+    def send_json(self, body: Dict, status: int = 200, headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, mock: 'MockPagerdutyServer', latency: float, throttle_every: int):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.mock = mock
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+class MockPagerdutyServer:
+    def __init__(self,
+                 handler=MockPagerdutyHandler,
+                 volumes: Optional[Dict[str, int]] = None,
+                 alerts_per_incident: int = 0,
+                 log_entries_per_incident: int = 0,
+                 latency: float = 0.0,
+                 throttle_every: int = 0,
+                 start: str = '2019-01-01T00:00:00Z',
+                 span_days: int = 30):
+        self.server = MockHTTPServer(handler, self, latency, throttle_every)
+        self.default_volume = handler.per_resource
+        self.volumes = volumes or {}
+        self.per_incident = {'alerts': alerts_per_incident, 'log_entries': log_entries_per_incident}
+        self.start = datetime.strptime(start, DATETIME_FORMAT)
+        self.span = timedelta(days=span_days)
+        self.templates = self._templates()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @staticmethod
+    def _templates() -> Dict[str, Dict]:
+        schemas = load_schemas()
+        templates = {resource: sample_value(schema) for resource, schema in schemas.items()}
+        incident = schemas['incidents']['properties']
+        templates['alerts'] = sample_value(incident['alerts']['items'])
+        templates['log_entries_of_incident'] = sample_value(incident['log_entries']['items'])
+        # The incidents listing doesn't embed sub-resources, the tap fetches them.
+        del templates['incidents']['alerts'], templates['incidents']['log_entries']
+        for resource in ('incidents', 'alerts'):
+            templates[resource]['status'] = 'resolved'
+        return templates
+
+    def volume(self, resource: str) -> int:
+        return self.volumes.get(resource, self.default_volume)
+
+    def timestamp(self, resource: str, index: int) -> datetime:
+        return self.start + self.span * index / max(self.volume(resource), 1)
+
+    def indexes(self, resource: str, query: Dict[str, List[str]]) -> range:
+        '''The indexes of the records of `resource` inside the requested window.'''
+        volume = self.volume(resource)
+        if resource not in TIMESTAMP_KEYS or 'since' not in query or 'until' not in query:
+            return range(volume)
+        since = datetime.strptime(query['since'][0], DATETIME_FORMAT)
+        until = datetime.strptime(query['until'][0], DATETIME_FORMAT)
+        step = self.span / max(volume, 1)
+        first = max(0, -((self.start - since) // step))
+        last = min(volume, -((self.start - until) // step))
+        return range(first, max(first, last))
+
+    def record(self, resource: str, index: int, parent_id: Optional[str] = None) -> Dict:
+        template_key = 'log_entries_of_incident' if resource == 'log_entries' and parent_id else resource
+        record = copy.deepcopy(self.templates[template_key])
+        record['id'] = f"{parent_id}-{index:04d}" if parent_id else f"P{index:06d}"
+        if parent_id is None and resource in TIMESTAMP_KEYS:
+            timestamp = datetime.strftime(self.timestamp(resource, index), DATETIME_FORMAT)
+            for key in TIMESTAMP_KEYS[resource]:
+                record[key] = timestamp
+        return record
+
+    @property
+    def requests(self) -> int:
+        return self.server.requests
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
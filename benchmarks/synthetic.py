@@ -0,0 +1,32 @@
+'''Builds synthetic Pagerduty records that exercise every field of a schema.'''
+import glob
+import os
+from typing import Any, Dict
+
+import singer
+
+SCHEMAS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tap_pagerduty', 'schemas')
+
+
+def load_schemas() -> Dict[str, Dict]:
+    return {os.path.splitext(os.path.basename(path))[0]: singer.utils.load_json(path)
+            for path in sorted(glob.glob(os.path.join(SCHEMAS_DIR, '*.json')))}
+
+
+def sample_value(schema: Dict, index: int = 0, array_length: int = 3, depth: int = 0) -> Any:
+    types = schema.get('type', [])
+    types = [types] if isinstance(types, str) else [t for t in types if t != 'null']
+    if schema.get('format') == 'date-time':
+        return f"2019-01-01T00:{index % 60:02d}:00Z"
+    if 'object' in types:
+        return {key: sample_value(value, index, array_length, depth + 1) for key, value in schema.get('properties', {}).items()}
+    if 'array' in types:
+        length = array_length if depth < 3 else 1
+        return [sample_value(schema.get('items', {}), i, array_length, depth + 1) for i in range(length)]
+    if 'integer' in types:
+        return index
+    if 'number' in types:
+        return index + 0.5
+    if 'boolean' in types:
+        return index % 2 == 0
+    return f"P{index:06d}"
@@ -35,7 +35,7 @@ setuptools.setup(
     ],
     keywords="singer tap python pagerduty",
     license='GPLv3',
-    packages=setuptools.find_packages(exclude=['tests']),
+    packages=setuptools.find_packages(exclude=['tests', 'benchmarks']),
     package_data={
         'tap_pagerduty': ['schemas/*.json']
     },
@@ -45,6 +45,9 @@ setuptools.setup(
         'backoff==1.8.0',
         'rollbar==0.14.7'
     ],
+    extras_require={
+        'asyncio': ['aiohttp>=3.6']
+    },
     python_requires='>=3.6',
     entry_points={
         'console_scripts': ['tap-pagerduty = tap_pagerduty:main']
@@ -1,9 +1,17 @@
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 import rollbar
 import singer
 
+from .aio import AsyncEngine
+from .cache import ResponseCache
+from .instrumentation import Instrumentation
+from .output import MessageWriter, TransformPool
+from .pagesize import PageSizes
+from .ratelimit import RateLimiter
+from .session import create_session
 from .streams import AVAILABLE_STREAMS
 
 LOGGER = singer.get_logger()
@@ -20,37 +28,112 @@ else:
     log_to_rollbar = True
 
 
+def account_configs(config):
+    '''Returns one config per entry of `accounts`, each overriding the
+    top-level keys with its own and naming the account in `account`.
+    Without `accounts`, the config itself is the only one.
+    '''
+    accounts = config.get('accounts')
+    if not accounts:
+        return [config]
+
+    base_config = {key: value for key, value in config.items() if key != 'accounts'}
+    configs = []
+    for account in accounts:
+        if 'name' not in account:
+            raise RuntimeError("Every entry of 'accounts' requires a 'name'.")
+        if any(account_config['account'] == account['name'] for account_config in configs):
+            raise RuntimeError(f"Account name '{account['name']}' is used more than once.")
+        overrides = {key: value for key, value in account.items() if key != 'name'}
+        configs.append(dict(base_config, **overrides, account=account['name']))
+    return configs
+
+
 def discover(config, state={}):
     LOGGER.info('Starting discovery..')
-    data = {}
-    data['streams'] = []
-    for available_stream in AVAILABLE_STREAMS:
-        data['streams'].append(available_stream(config=config, state=state))
+    # Entries come straight from the schema registry, no stream, session
+    # or connection pool is set up to describe them.
+    account_config = account_configs(config)[0]
+    data = {'streams': [available_stream.catalog_entry(account_config) for available_stream in AVAILABLE_STREAMS]}
     catalog = singer.catalog.Catalog.from_dict(data=data)
     singer.catalog.write_catalog(catalog)
     LOGGER.info('Finished discovery..')
 
 
+def sync_stream(stream, track_currently_syncing=True):
+    if track_currently_syncing:
+        stream.writer.set_currently_syncing(state=stream.state, tap_stream_id=stream.tap_stream_id)
+    stream.write_state()
+    stream.write_schema()
+    stream.sync()
+    if track_currently_syncing:
+        stream.writer.set_currently_syncing(state=stream.state, tap_stream_id=None)
+    stream.write_state()
+
+
+def sync_streams(streams, stream_concurrency=1, track_currently_syncing=True):
+    if stream_concurrency > 1:
+        # `currently_syncing` can only name one stream, so it is left
+        # unset while several streams are syncing at once.
+        with ThreadPoolExecutor(max_workers=stream_concurrency) as executor:
+            futures = [executor.submit(sync_stream, stream, track_currently_syncing=False) for stream in streams]
+            for future in futures:
+                future.result()
+    else:
+        for stream in streams:
+            sync_stream(stream, track_currently_syncing=track_currently_syncing)
+
+
 def sync(config, catalog, state={}):
     LOGGER.info('Starting sync..')
-    selected_streams = {catalog_entry.stream for catalog_entry in catalog.get_selected_streams(state)}
+    selected_streams = {catalog_entry.stream: catalog_entry for catalog_entry in catalog.get_selected_streams(state)}
+
+    writer = MessageWriter()
+    cache = ResponseCache.from_config(config)
+    instrumentation = Instrumentation.from_config(config)
+    transform_pool = TransformPool.from_config(config)
+    configs = account_configs(config)
+    engines = []
+    account_streams = []
+    for account_config in configs:
+        # Every account gets its own connection pool and rate limit budget.
+        session = create_session(account_config)
+        rate_limiter = RateLimiter.from_config(account_config)
+        page_sizes = PageSizes.from_config(account_config)
+        engine = AsyncEngine.from_config(account_config, rate_limiter, cache, instrumentation, page_sizes)
+        if engine is not None:
+            engines.append(engine)
+        streams_to_sync = []
+        for available_stream in AVAILABLE_STREAMS:
+            if available_stream.stream in selected_streams:
+                streams_to_sync.append(available_stream(config=account_config, state=state, session=session, rate_limiter=rate_limiter, writer=writer, cache=cache, engine=engine, instrumentation=instrumentation, page_sizes=page_sizes, catalog_entry=selected_streams[available_stream.stream], transform_pool=transform_pool))
+        account_streams.append((streams_to_sync, account_config.get('stream_concurrency', 1)))
 
-    streams_to_sync = set()
-    for available_stream in AVAILABLE_STREAMS:
-        if available_stream.stream in selected_streams:
-            streams_to_sync.add(available_stream(config=config, state=state))
-
-    for stream in streams_to_sync:
-        singer.bookmarks.set_currently_syncing(state=stream.state, tap_stream_id=stream.tap_stream_id)
-        stream.write_state()
-        stream.write_schema()
-        stream.sync()
-        singer.bookmarks.set_currently_syncing(state=stream.state, tap_stream_id=None)
-        stream.write_state()
+    try:
+        if len(account_streams) == 1:
+            sync_streams(*account_streams[0])
+        else:
+            # Accounts are synced side by side, each with its own
+            # `stream_concurrency` streams at once.
+            with ThreadPoolExecutor(max_workers=len(account_streams)) as executor:
+                futures = [executor.submit(sync_streams, streams_to_sync, stream_concurrency, track_currently_syncing=False)
+                           for streams_to_sync, stream_concurrency in account_streams]
+                for future in futures:
+                    future.result()
+    finally:
+        instrumentation.report(config.get('metrics_path'))
+        for engine in engines:
+            engine.close()
+        if transform_pool is not None:
+            transform_pool.close()
+        if cache is not None:
+            cache.close()
 
 
 def _main():
-    args = singer.utils.parse_args(required_config_keys=["token", "email", "since"])
+    args = singer.utils.parse_args(required_config_keys=["since"])
+    for account_config in account_configs(args.config):
+        singer.utils.check_config(account_config, ["token", "email"])
     if args.discover:
         discover(config=args.config)
     else:
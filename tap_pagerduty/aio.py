@@ -0,0 +1,235 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Awaitable, Coroutine, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import backoff
+import singer
+
+from .cache import ResponseCache
+from .instrumentation import Instrumentation
+from .pagesize import MAX_PAGE_SIZE, PageSizes
+from .pagination import MAX_OFFSET
+from .ratelimit import MAX_RETRY_AFTER_ATTEMPTS, RateLimiter, parse_retry_after
+from .session import construct_headers
+
+LOGGER = singer.get_logger()
+
+ENGINES = ('requests', 'asyncio')
+DEFAULT_MAX_IN_FLIGHT = 100
+
+# Same limit as the `backoff` decorators on `PagerdutyStream._get`.
+MAX_BACKOFF_SECONDS = 120
+
+
+def is_fatal_status(status: int) -> bool:
+    return 400 <= status < 500 and status != 429
+
+
+class AsyncEngine:
+    '''Makes API requests with aiohttp on an asyncio event loop.
+
+    The loop runs on a background thread started on first use, so streams
+    keep their blocking contract and hand coroutines over with `run`.
+    Any number of requests can then be awaited together, e.g. every
+    sub-resource of a page of incidents, bounded by `max_in_flight`
+    connections rather than by a pool of threads.
+
+    Requests share the rate limiter and response cache with the rest of
+    the tap, and are retried like `PagerdutyStream._get`: 429s carrying
+    `Retry-After` pause the limiter, other errors back off on a Fibonacci
+    schedule until `MAX_BACKOFF_SECONDS` have gone by.
+    '''
+    def __init__(self,
+                 config: Dict,
+                 rate_limiter: RateLimiter,
+                 cache: Optional[ResponseCache] = None,
+                 instrumentation: Optional[Instrumentation] = None,
+                 page_sizes: Optional[PageSizes] = None,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+        # aiohttp is imported on first use only, it takes longer to import
+        # than the rest of the tap put together.
+        try:
+            import aiohttp  # noqa: F401
+        except ImportError:
+            raise RuntimeError("The 'asyncio' engine requires aiohttp. Install it with `pip install tap-pagerduty[asyncio]`.")
+        self.headers = construct_headers(config['token'], config['email'])
+        self.account = config.get('account')
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        self.page_sizes = page_sizes
+        self.max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._session = None
+
+    @classmethod
+    def from_config(cls,
+                    config: Dict,
+                    rate_limiter: RateLimiter,
+                    cache: Optional[ResponseCache] = None,
+                    instrumentation: Optional[Instrumentation] = None,
+                    page_sizes: Optional[PageSizes] = None) -> Optional['AsyncEngine']:
+        '''Builds the engine selected by the `engine` config key, or
+        returns None for the default blocking `requests` engine.
+        '''
+        engine = config.get('engine', 'requests')
+        if engine not in ENGINES:
+            raise RuntimeError(f"Unsupported engine '{engine}'. Expected one of {', '.join(ENGINES)}.")
+        if engine == 'requests':
+            return None
+        return cls(config, rate_limiter, cache=cache, instrumentation=instrumentation, page_sizes=page_sizes,
+                   max_in_flight=config.get('async_max_in_flight', DEFAULT_MAX_IN_FLIGHT))
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='tap-pagerduty-asyncio', daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def run(self, coroutine: Coroutine) -> Any:
+        '''Runs a coroutine on the engine's loop and blocks until it completes.'''
+        return asyncio.run_coroutine_threadsafe(coroutine, self._start()).result()
+
+    async def gather(self, coroutines: List[Awaitable]) -> List[Any]:
+        return await asyncio.gather(*coroutines)
+
+    def _client(self):
+        import aiohttp
+        if self._session is None:
+            self._session = aiohttp.ClientSession(headers=self.headers,
+                                                  connector=aiohttp.TCPConnector(limit=self.max_in_flight),
+                                                  raise_for_status=False)
+        return self._session
+
+    async def _request(self, url: str, params: Optional[Dict], headers: Dict) -> Dict:
+        path = urlsplit(url).path
+        for _ in range(MAX_RETRY_AFTER_ATTEMPTS):
+            await self.rate_limiter.acquire_async()
+            started_at = time.perf_counter()
+            async with self._client().get(url, params=params, headers=headers) as response:
+                data = await response.read()
+                seconds = time.perf_counter() - started_at
+                self.instrumentation.record_request(path, seconds, response.status, len(data))
+                self.rate_limiter.update_from_headers(response.headers)
+                if response.status == 429 and 'Retry-After' in response.headers:
+                    self.instrumentation.record_retry(path, parse_retry_after(response.headers['Retry-After']) or 0.0)
+                    continue
+                if response.status == 304:
+                    return {'status': 304}
+                response.raise_for_status()
+                body = json.loads(data)
+                if self.page_sizes is not None:
+                    self.page_sizes.observe(path, params, seconds, len(data), body)
+                return {'status': response.status,
+                        'body': body,
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified')}
+        response.raise_for_status()
+        return {}
+
+    async def _request_with_backoff(self, url: str, params: Optional[Dict], headers: Dict) -> Dict:
+        import aiohttp
+        wait = backoff.fibo()
+        loop = asyncio.get_event_loop()
+        started_at = loop.time()
+        while True:
+            try:
+                return await self._request(url, params, headers)
+            except aiohttp.ClientResponseError as e:
+                if is_fatal_status(e.status):
+                    raise
+                error: Exception = e
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = e
+            elapsed = loop.time() - started_at
+            if elapsed >= MAX_BACKOFF_SECONDS:
+                raise error
+            seconds = min(backoff.full_jitter(next(wait)), MAX_BACKOFF_SECONDS - elapsed)
+            LOGGER.info(f"Backing off {seconds:0.1f} seconds after {error!r} from {url}")
+            self.instrumentation.record_retry(urlsplit(url).path, seconds)
+            if self.page_sizes is not None:
+                self.page_sizes.failed(urlsplit(url).path)
+            await asyncio.sleep(seconds)
+
+    async def get(self, url: str, params: Optional[Dict] = None, cacheable: bool = False, immutable: bool = False) -> Dict:
+        '''The async counterpart of `PagerdutyStream._get`.'''
+        cache = self.cache if cacheable else None
+        cache_key = None
+        cached = None
+        headers: Dict[str, str] = {}
+        if cache is not None:
+            cache_key = cache.key(url, params, namespace=self.account)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                if cached.fresh:
+                    return cached.body
+                headers = cached.conditional_headers()
+
+        response = await self._request_with_backoff(url, params, headers)
+        if cache is None or cache_key is None:
+            return response['body']
+        if response['status'] == 304 and cached is not None:
+            cache.refresh(cache_key)
+            return cached.body
+        cache.put(cache_key, response['body'],
+                  etag=response['etag'],
+                  last_modified=response['last_modified'],
+                  immutable=immutable)
+        return response['body']
+
+    async def list_all(self,
+                       url: str,
+                       key: str,
+                       params: Optional[Dict] = None,
+                       cacheable: bool = False,
+                       immutable: bool = False,
+                       max_items: Optional[int] = None) -> List[Dict]:
+        '''Walks every page of a listing and returns the combined records
+        under `key`, stopping once `max_items` have been read if set.
+        '''
+        params = dict(params or {})
+        params.setdefault('offset', 0)
+        page_limit = None
+        if self.page_sizes is not None:
+            page_limit = self.page_sizes.limiter(urlsplit(url).path, params.get('limit', MAX_PAGE_SIZE))
+        items: List[Dict] = []
+        while True:
+            if page_limit is not None:
+                params['limit'] = page_limit()
+            limit = params.get('limit', MAX_PAGE_SIZE)
+            page = await self.get(url, params=params, cacheable=cacheable, immutable=immutable)
+            items.extend(page[key])
+            if max_items is not None and len(items) >= max_items:
+                if len(items) > max_items or page.get('more') is True:
+                    LOGGER.warning(f"Truncated {url} to {max_items} records.")
+                return items[:max_items]
+            if page.get('more') is not True:
+                return items
+            next_offset = params['offset'] + limit
+            if next_offset + limit > MAX_OFFSET:
+                LOGGER.warning(f"Reached Pagerduty's pagination limit of {MAX_OFFSET} records for {url}.")
+                return items
+            params = dict(params, offset=next_offset)
+
+    async def _close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def close(self):
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None or thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
@@ -0,0 +1,115 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+from urllib.parse import urlencode
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class CachedResponse(NamedTuple):
+    body: Dict
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh: bool
+
+    def conditional_headers(self) -> Dict[str, str]:
+        '''Headers revalidating this entry, so an unchanged response comes back as a 304.'''
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    '''An on-disk cache of API responses backed by sqlite.
+
+    Entries are keyed by URL and params and expire after `ttl_seconds`,
+    unless stored as immutable. Expired entries are kept so that they can
+    be revalidated with a conditional request. Once the cached bodies add
+    up to more than `max_bytes`, the least recently used entries are
+    evicted. Safe to share between threads.
+    '''
+    def __init__(self, path: str, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                expires_at REAL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )''')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+        self._size = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    @classmethod
+    def from_config(cls, config: Dict) -> Optional['ResponseCache']:
+        '''Builds the cache described by the `cache` config key, if any.'''
+        cache_config = config.get('cache')
+        if not cache_config:
+            return None
+        return cls(path=cache_config['path'],
+                   ttl_seconds=cache_config.get('ttl_seconds', DEFAULT_TTL_SECONDS),
+                   max_bytes=cache_config.get('max_bytes', DEFAULT_MAX_BYTES))
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict] = None, namespace: Optional[str] = None) -> str:
+        '''Entries of different accounts are kept apart by `namespace`.'''
+        key = f"{url}?{urlencode(sorted((params or {}).items()), doseq=True)}"
+        return key if namespace is None else f"{namespace}|{key}"
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute('SELECT body, etag, last_modified, expires_at FROM responses WHERE key = ?',
+                                           (key,)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+        body, etag, last_modified, expires_at = row
+        return CachedResponse(body=json.loads(body),
+                              etag=etag,
+                              last_modified=last_modified,
+                              fresh=expires_at is None or expires_at > now)
+
+    def put(self, key: str, body: Dict, etag: Optional[str] = None, last_modified: Optional[str] = None, immutable: bool = False):
+        now = time.time()
+        text = json.dumps(body, separators=(',', ':'))
+        expires_at = None if immutable else now + self.ttl_seconds
+        with self._lock:
+            previous = self._connection.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                     (key, text, etag, last_modified, expires_at, now, len(text)))
+            self._size += len(text) - (previous[0] if previous else 0)
+            self._evict()
+
+    def refresh(self, key: str):
+        '''Marks an entry as fresh again after the API confirmed it is unchanged.'''
+        now = time.time()
+        with self._lock:
+            self._connection.execute('UPDATE responses SET expires_at = ?, accessed_at = ? WHERE key = ? AND expires_at IS NOT NULL',
+                                     (now + self.ttl_seconds, now, key))
+
+    def _evict(self):
+        while self._size > self.max_bytes:
+            row = self._connection.execute('SELECT key, size FROM responses ORDER BY accessed_at, rowid LIMIT 1').fetchone()
+            if row is None:
+                self._size = 0
+                return
+            self._connection.execute('DELETE FROM responses WHERE key = ?', (row[0],))
+            self._size -= row[1]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
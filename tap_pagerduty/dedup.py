@@ -0,0 +1,43 @@
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+DEFAULT_DEDUP_CAPACITY = 100000
+
+
+class RecordDeduplicator:
+    '''Recognises records that were already emitted during a sync.
+
+    Windows share their inclusive `since`/`until` bounds, and offset
+    pagination over a changing listing can hand out the same record twice,
+    so records are keyed on their id and replication key value: a record
+    that changed in between is a new version and goes through. Only the
+    `capacity` most recently seen keys are remembered, which keeps memory
+    bounded on long backfills while still catching duplicates, as those
+    turn up close together.
+    '''
+    def __init__(self, key_property: str, replication_key: Optional[str] = None, capacity: int = DEFAULT_DEDUP_CAPACITY):
+        self.key_property = key_property
+        self.replication_key = replication_key
+        self.capacity = capacity
+        self.seen: 'OrderedDict[Tuple[Hashable, Hashable], None]' = OrderedDict()
+        self.duplicates = 0
+
+    @classmethod
+    def from_config(cls, config: Dict, key_property: str, replication_key: Optional[str] = None) -> Optional['RecordDeduplicator']:
+        '''Returns None when `dedup_capacity` is 0.'''
+        capacity = config.get('dedup_capacity', DEFAULT_DEDUP_CAPACITY)
+        if capacity <= 0:
+            return None
+        return cls(key_property, replication_key, capacity)
+
+    def is_duplicate(self, record: Dict) -> bool:
+        '''Whether `record` was seen before, remembering it if not.'''
+        key = (record.get(self.key_property), record.get(self.replication_key) if self.replication_key else None)
+        if key in self.seen:
+            self.seen.move_to_end(key)
+            self.duplicates += 1
+            return True
+        self.seen[key] = None
+        if len(self.seen) > self.capacity:
+            self.seen.popitem(last=False)
+        return False
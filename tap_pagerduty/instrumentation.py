@@ -0,0 +1,172 @@
+import json
+import re
+import threading
+from bisect import bisect_left
+from typing import Dict, Optional
+
+import singer
+from singer.metrics import Metric, Point, Status, Tag
+
+LOGGER = singer.get_logger()
+
+# Upper bounds of the latency histogram buckets, growing by a quarter
+# from 1ms to a little over 10 minutes. Percentiles are reported as the
+# bound of the bucket they fall in, so they overestimate by under 25%.
+LATENCY_BUCKETS = [0.001 * 1.25 ** i for i in range(60)]
+PERCENTILES = (50, 90, 99)
+
+# Collection names are lowercase words; anything else in a path, such as
+# Pagerduty's `PABC123` ids, is an identifier.
+_COLLECTION = re.compile(r'^[a-z_]+$')
+
+
+def endpoint_template(url_suffix: str) -> str:
+    '''Replaces the ids in a request path with `{id}`, e.g.
+    `/incidents/PABC123/alerts` becomes `/incidents/{id}/alerts`.
+    '''
+    return '/'.join(segment if not segment or _COLLECTION.match(segment) else '{id}'
+                    for segment in url_suffix.split('?')[0].split('/'))
+
+
+class EndpointStats:
+    '''Request accounting for a single endpoint template.'''
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        self.bytes_received = 0
+        self.latency_seconds = 0.0
+        self.latency_max = 0.0
+        self.latency_histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def percentile(self, percent: float) -> float:
+        rank = percent / 100 * sum(self.latency_histogram)
+        seen = 0
+        for index, count in enumerate(self.latency_histogram):
+            seen += count
+            if count and seen >= rank:
+                return min(LATENCY_BUCKETS[index], self.latency_max) if index < len(LATENCY_BUCKETS) else self.latency_max
+        return 0.0
+
+    def to_dict(self) -> Dict:
+        summary = {
+            "requests": self.requests,
+            "errors": self.errors,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "backoff_seconds": round(self.backoff_seconds, 3),
+            "bytes_received": self.bytes_received,
+            "latency_mean": round(self.latency_seconds / self.requests, 4) if self.requests else 0.0,
+            "latency_max": round(self.latency_max, 4),
+        }
+        for percent in PERCENTILES:
+            summary[f"latency_p{percent}"] = round(self.percentile(percent), 4)
+        return summary
+
+
+class StageStats:
+    '''Time a stream spends transforming and writing its records.'''
+    def __init__(self):
+        self.records = 0
+        self.transform_seconds = 0.0
+        self.write_seconds = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "records": self.records,
+            "transform_seconds": round(self.transform_seconds, 3),
+            "write_seconds": round(self.write_seconds, 3),
+        }
+
+
+class Instrumentation:
+    '''Collects request and output statistics across every stream.
+
+    Each request is logged as a Singer `http_request_duration` metric
+    tagged with its endpoint template and accumulated per template, along
+    with its size, 429s, retries and time spent backing off. Record
+    emitters add how long each stream spent in the transform and on
+    stdout. `log_summary` reports it all once the sync is over, and
+    `dump` writes the same summary as JSON. Safe to share between threads.
+    '''
+    def __init__(self, log_requests: bool = True):
+        self.log_requests = log_requests
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.streams: Dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'Instrumentation':
+        return cls(log_requests=config.get('log_request_metrics', True))
+
+    def _endpoint(self, url_suffix: str) -> EndpointStats:
+        template = endpoint_template(url_suffix)
+        stats = self.endpoints.get(template)
+        if stats is None:
+            stats = self.endpoints[template] = EndpointStats()
+        return stats
+
+    def record_request(self, url_suffix: str, seconds: float, status_code: int, bytes_received: int = 0):
+        with self._lock:
+            stats = self._endpoint(url_suffix)
+            stats.requests += 1
+            stats.bytes_received += bytes_received
+            stats.latency_seconds += seconds
+            stats.latency_max = max(stats.latency_max, seconds)
+            stats.latency_histogram[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            if status_code == 429:
+                stats.throttled += 1
+            elif status_code >= 400:
+                stats.errors += 1
+        if self.log_requests:
+            singer.metrics.log(LOGGER, Point('timer', Metric.http_request_duration, seconds, {
+                Tag.endpoint: endpoint_template(url_suffix),
+                Tag.http_status_code: status_code,
+                Tag.status: Status.succeeded if status_code < 400 else Status.failed
+            }))
+
+    def record_retry(self, url_suffix: str, seconds: float = 0.0):
+        '''Counts a retried request and the time waited before retrying it.'''
+        with self._lock:
+            stats = self._endpoint(url_suffix)
+            stats.retries += 1
+            stats.backoff_seconds += seconds
+
+    def record_stage(self, stream_name: str, records: int, transform_seconds: float, write_seconds: float):
+        with self._lock:
+            stats = self.streams.get(stream_name)
+            if stats is None:
+                stats = self.streams[stream_name] = StageStats()
+            stats.records += records
+            stats.transform_seconds += transform_seconds
+            stats.write_seconds += write_seconds
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                "endpoints": {template: stats.to_dict() for template, stats in sorted(self.endpoints.items())},
+                "streams": {stream_name: stats.to_dict() for stream_name, stats in sorted(self.streams.items())},
+            }
+
+    def log_summary(self):
+        summary = self.summary()
+        for template, stats in summary["endpoints"].items():
+            LOGGER.info(f"Requests to {template}: {stats['requests']} in total, "
+                        f"p50 {stats['latency_p50']}s, p90 {stats['latency_p90']}s, p99 {stats['latency_p99']}s, "
+                        f"{stats['bytes_received']} bytes, {stats['throttled']} throttled, "
+                        f"{stats['retries']} retries after {stats['backoff_seconds']}s of backoff.")
+        for stream_name, stats in summary["streams"].items():
+            LOGGER.info(f"Emitted {stats['records']} {stream_name} records, spending "
+                        f"{stats['transform_seconds']}s transforming and {stats['write_seconds']}s writing them.")
+
+    def dump(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def report(self, metrics_path: Optional[str] = None):
+        '''Logs the summary and writes it to `metrics_path`, if given.'''
+        self.log_summary()
+        if metrics_path is not None:
+            self.dump(metrics_path)
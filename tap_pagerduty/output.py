@@ -0,0 +1,243 @@
+import copy
+import hashlib
+import json
+import multiprocessing
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Dict, List, Optional, Set, TextIO, Tuple
+
+import singer
+from singer.transform import SchemaMismatch
+
+from .instrumentation import Instrumentation
+from .transform import CompiledTransformer
+
+DEFAULT_FLUSH_SIZE = 100
+DEFAULT_TRANSFORM_CHUNK_SIZE = 100
+
+# Records coming out of singer.Transformer only hold JSON native types,
+# so the C-accelerated stdlib encoder can be used instead of simplejson.
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+
+class MessageWriter:
+    '''Writes Singer messages to stdout on behalf of every stream.
+
+    Streams may sync concurrently, so each message is serialized and
+    written as a whole line while holding a lock. The same lock guards
+    the shared state dict, which streams update through
+    `write_bookmark` and `set_currently_syncing`.
+    '''
+    def __init__(self, out: Optional[TextIO] = None):
+        self._out = out
+        self.lock = threading.RLock()
+
+    @property
+    def out(self) -> TextIO:
+        return self._out if self._out is not None else sys.stdout
+
+    def write_message(self, message: singer.Message):
+        line = singer.format_message(message) + '\n'
+        with self.lock:
+            self.out.write(line)
+            self.out.flush()
+
+    def write_lines(self, lines: List[str]):
+        '''Writes pre-serialized messages with a single write and flush.'''
+        if not lines:
+            return
+        data = '\n'.join(lines) + '\n'
+        with self.lock:
+            self.out.write(data)
+            self.out.flush()
+
+    def write_schema(self, stream_name: str, schema: Dict, key_properties: List[str]):
+        self.write_message(singer.SchemaMessage(stream=stream_name, schema=schema, key_properties=key_properties))
+
+    def write_state(self, state: Dict):
+        with self.lock:
+            self.write_message(singer.StateMessage(value=copy.deepcopy(state)))
+
+    def write_bookmark(self, state: Dict, tap_stream_id: str, key: str, val):
+        with self.lock:
+            singer.bookmarks.write_bookmark(state=state, tap_stream_id=tap_stream_id, key=key, val=val)
+
+    def clear_bookmark(self, state: Dict, tap_stream_id: str, key: str):
+        with self.lock:
+            singer.bookmarks.clear_bookmark(state=state, tap_stream_id=tap_stream_id, key=key)
+
+    def set_currently_syncing(self, state: Dict, tap_stream_id: Optional[str]):
+        with self.lock:
+            singer.bookmarks.set_currently_syncing(state=state, tap_stream_id=tap_stream_id)
+
+
+# Compiled transformers of the schemas seen by a transform worker process.
+_worker_transformers: Dict[str, CompiledTransformer] = {}
+
+
+def _transform_chunk(schema_key: str, schema: Dict, records: List[Dict], prefix: str, suffix: str) -> Tuple[List[str], Set[str]]:
+    '''Runs in a transform worker. Returns the serialized RECORD messages
+    of `records` along with the paths of the fields dropped so far.
+    '''
+    transformer = _worker_transformers.get(schema_key)
+    if transformer is None:
+        transformer = _worker_transformers[schema_key] = CompiledTransformer(schema)
+    try:
+        lines = [prefix + _encode(transformer.transform(record)) + suffix for record in records]
+    except SchemaMismatch as e:
+        # SchemaMismatch can't be unpickled in the parent process.
+        raise RuntimeError(str(e))
+    return lines, transformer.removed | transformer.transformer.removed
+
+
+class TransformPool:
+    '''A pool of processes transforming and serializing records, shared by
+    every stream of a sync, so that CPU-bound schema work on large records
+    runs on all cores instead of one.
+
+    Record emitters hand over chunks of `chunk_size` records and get their
+    messages back in order. At most `max_pending` chunks per emitter are in
+    flight, which bounds memory when workers fall behind. Workers are
+    spawned rather than forked, as the tap runs several threads, except on
+    Python 3.6 where the executor can only fork.
+    '''
+    def __init__(self, workers: int, chunk_size: int = DEFAULT_TRANSFORM_CHUNK_SIZE):
+        self.workers = workers
+        self.chunk_size = max(chunk_size, 1)
+        self.max_pending = 2 * workers
+        if sys.version_info >= (3, 7):
+            self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        else:
+            # `mp_context` is new in Python 3.7, workers are forked before.
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    @classmethod
+    def from_config(cls, config: Dict) -> Optional['TransformPool']:
+        '''Returns None unless `transform_workers` is set.'''
+        workers = config.get('transform_workers', 0)
+        if workers <= 0:
+            return None
+        return cls(workers, chunk_size=config.get('transform_chunk_size', DEFAULT_TRANSFORM_CHUNK_SIZE))
+
+    def submit(self, schema_key: str, schema: Dict, records: List[Dict], prefix: str, suffix: str) -> Future:
+        return self.executor.submit(_transform_chunk, schema_key, schema, records, prefix, suffix)
+
+    def close(self):
+        self.executor.shutdown()
+
+
+class RecordEmitter:
+    '''Transforms, serializes and writes the records of a single stream.
+
+    The stream's schema is compiled into a `CompiledTransformer` once, and
+    the RECORD message envelope is built once so that only the record itself
+    is encoded per message. Serialized messages are buffered and written to the
+    `MessageWriter` in batches of `flush_size`. Records buffered together
+    share the same `time_extracted`.
+
+    With `fields` given, every other top-level field is dropped from records
+    before they are transformed, and `schema` should only describe those.
+    `extra_fields` are added to every record, e.g. the account it came from.
+
+    With a `transform_pool`, records are transformed and serialized in
+    chunks on its worker processes, and written in the order they were
+    emitted. The transform time reported is then the time the stream
+    spent handing chunks over and waiting for them.
+
+    Use as a context manager, or call `flush()` before writing a STATE
+    message so records and state stay in order. On exit, the time spent
+    transforming and writing is reported to `instrumentation`, if given.
+    '''
+    def __init__(self,
+                 writer: MessageWriter,
+                 stream_name: str,
+                 schema: Dict,
+                 flush_size: int = DEFAULT_FLUSH_SIZE,
+                 instrumentation: Optional[Instrumentation] = None,
+                 fields: Optional[Set[str]] = None,
+                 extra_fields: Optional[Dict] = None,
+                 transform_pool: Optional[TransformPool] = None):
+        self.writer = writer
+        self.fields = fields
+        self.extra_fields = extra_fields
+        self.stream_name = stream_name
+        self.instrumentation = instrumentation
+        self.schema = schema
+        self.flush_size = max(flush_size, 1)
+        self.transformer = CompiledTransformer(schema)
+        self._prefix = _encode({"type": "RECORD", "stream": stream_name})[:-1] + ',"record":'
+        self._suffix = ''
+        self._buffer: List[str] = []
+        self.transform_pool = transform_pool
+        # Identifies the schema to workers, which compile it once each.
+        self._schema_key = hashlib.sha1(_encode(schema).encode('utf-8')).hexdigest() if transform_pool is not None else ''
+        self._chunk: List[Dict] = []
+        self._pending: Deque[Future] = deque()
+        self.emitted = 0
+        self.transform_seconds = 0.0
+        self.write_seconds = 0.0
+
+    def emit(self, record: Dict):
+        started_at = time.perf_counter()
+        if self.fields is not None:
+            record = {key: value for key, value in record.items() if key in self.fields}
+        if self.extra_fields is not None:
+            record = dict(record, **self.extra_fields)
+        if self.transform_pool is not None:
+            self._chunk.append(record)
+            if len(self._chunk) >= self.transform_pool.chunk_size:
+                self._submit_chunk()
+            self.transform_seconds += time.perf_counter() - started_at
+            self.emitted += 1
+            return
+        transformed_record = self.transformer.transform(record)
+        if not self._buffer:
+            time_extracted = singer.utils.strftime(singer.utils.now())
+            self._suffix = ',"time_extracted":' + _encode(time_extracted) + '}'
+        self._buffer.append(self._prefix + _encode(transformed_record) + self._suffix)
+        self.transform_seconds += time.perf_counter() - started_at
+        self.emitted += 1
+        if len(self._buffer) >= self.flush_size:
+            self.flush()
+
+    def _submit_chunk(self):
+        chunk, self._chunk = self._chunk, []
+        suffix = ',"time_extracted":' + _encode(singer.utils.strftime(singer.utils.now())) + '}'
+        self._pending.append(self.transform_pool.submit(self._schema_key, self.schema, chunk, self._prefix, suffix))
+        while len(self._pending) > self.transform_pool.max_pending:
+            self._collect(self._pending.popleft())
+
+    def _collect(self, future: Future):
+        lines, removed = future.result()
+        self.transformer.removed |= removed
+        self._buffer.extend(lines)
+        if len(self._buffer) >= self.flush_size:
+            self._write()
+
+    def flush(self):
+        if self._chunk or self._pending:
+            started_at = time.perf_counter()
+            if self._chunk:
+                self._submit_chunk()
+            while self._pending:
+                self._collect(self._pending.popleft())
+            self.transform_seconds += time.perf_counter() - started_at
+        self._write()
+
+    def _write(self):
+        buffer, self._buffer = self._buffer, []
+        started_at = time.perf_counter()
+        self.writer.write_lines(buffer)
+        self.write_seconds += time.perf_counter() - started_at
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        self.transformer.log_warning()
+        if self.instrumentation is not None:
+            self.instrumentation.record_stage(self.stream_name, self.emitted, self.transform_seconds, self.write_seconds)
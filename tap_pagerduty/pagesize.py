@@ -0,0 +1,94 @@
+import threading
+from typing import Callable, Dict, Optional
+
+from .instrumentation import endpoint_template
+
+# Pagerduty's classic pagination caps `limit` at 100.
+MAX_PAGE_SIZE = 100
+MIN_PAGE_SIZE = 10
+DEFAULT_LATENCY_TARGET_SECONDS = 2.0
+MAX_PAGE_BYTES = 4 * 1024 * 1024
+GROWTH = 1.25
+
+
+def page_records(body: Dict) -> int:
+    '''The number of records in a page, listed under its resource's key.'''
+    return max((len(value) for value in body.values() if isinstance(value, list)), default=0)
+
+
+class AdaptivePageSize:
+    '''The page size of a single endpoint, adjusted after every page.
+
+    Pages answered slower than `latency_target` or larger than `max_bytes`
+    halve the page size, as do failed requests. Full pages, holding as many
+    records as were asked for, answered well within the target grow it
+    again by a quarter, up to `maximum`.
+    '''
+    def __init__(self,
+                 maximum: int = MAX_PAGE_SIZE,
+                 minimum: int = MIN_PAGE_SIZE,
+                 latency_target: float = DEFAULT_LATENCY_TARGET_SECONDS,
+                 max_bytes: int = MAX_PAGE_BYTES):
+        self.maximum = maximum
+        self.minimum = min(minimum, maximum)
+        self.latency_target = latency_target
+        self.max_bytes = max_bytes
+        self.size = float(maximum)
+
+    @property
+    def limit(self) -> int:
+        return int(self.size)
+
+    def observe(self, limit: int, seconds: float, size_bytes: int, records: int):
+        if seconds > self.latency_target or size_bytes > self.max_bytes:
+            self.size = max(float(self.minimum), min(self.size, limit / 2))
+        elif records >= limit >= self.limit and seconds < self.latency_target / 2:
+            self.size = min(float(self.maximum), self.size * GROWTH)
+
+    def failed(self):
+        self.size = max(float(self.minimum), self.size / 2)
+
+
+class PageSizes:
+    '''Adaptive page sizes for every endpoint template, shared by all
+    streams and safe to use from any thread.
+    '''
+    def __init__(self, latency_target: float = DEFAULT_LATENCY_TARGET_SECONDS):
+        self.latency_target = latency_target
+        self.endpoints: Dict[str, AdaptivePageSize] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> Optional['PageSizes']:
+        '''Returns None unless `adaptive_page_size` is enabled.'''
+        if not config.get('adaptive_page_size', False):
+            return None
+        return cls(latency_target=config.get('page_latency_target_seconds', DEFAULT_LATENCY_TARGET_SECONDS))
+
+    def _endpoint(self, url_suffix: str) -> AdaptivePageSize:
+        template = endpoint_template(url_suffix)
+        page_size = self.endpoints.get(template)
+        if page_size is None:
+            page_size = self.endpoints[template] = AdaptivePageSize(latency_target=self.latency_target)
+        return page_size
+
+    def limit(self, url_suffix: str) -> int:
+        with self._lock:
+            return self._endpoint(url_suffix).limit
+
+    def limiter(self, url_suffix: str, maximum: int = MAX_PAGE_SIZE) -> Callable[[], int]:
+        '''Returns a callable picking the `limit` of the next page
+        requested from `url_suffix`, never above `maximum`.
+        '''
+        return lambda: max(min(self.limit(url_suffix), maximum), 1)
+
+    def observe(self, url_suffix: str, params: Optional[Dict], seconds: float, size_bytes: int, body: Dict):
+        '''Accounts for a page of a listing, `body` being its parsed JSON.'''
+        if not params or 'limit' not in params:
+            return
+        with self._lock:
+            self._endpoint(url_suffix).observe(int(params['limit']), seconds, size_bytes, page_records(body))
+
+    def failed(self, url_suffix: str):
+        with self._lock:
+            self._endpoint(url_suffix).failed()
@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Generator, Iterator, Optional, Tuple
+
+import singer
+
+LOGGER = singer.get_logger()
+
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# Pagerduty's classic pagination refuses requests where offset + limit
+# goes past this many records, no matter how many more there are.
+MAX_OFFSET = 10000
+
+# Windows are not split any further than this.
+MIN_WINDOW = timedelta(seconds=1)
+
+
+def _parse_window(params: Dict) -> Optional[Tuple[datetime, datetime]]:
+    try:
+        return (datetime.strptime(params['since'], DATETIME_FORMAT),
+                datetime.strptime(params['until'], DATETIME_FORMAT))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def paginate(get: Callable[..., Dict],
+             url_suffix: str,
+             params: Optional[Dict] = None,
+             prefetch: bool = True,
+             max_offset: int = MAX_OFFSET,
+             page_limit: Optional[Callable[[], int]] = None) -> Generator[Dict, None, None]:
+    '''Yields each page of a Pagerduty listing endpoint.
+
+    `get` is called as `get(url_suffix=..., params=...)` for every page and
+    the caller's `params` are never modified. With `prefetch`, the next page
+    is requested in the background while the current one is processed.
+
+    When `params` carry a `since`/`until` window holding more records than
+    offset pagination can reach, the window is split in half, recursively,
+    before any of its records are yielded.
+
+    `page_limit`, if given, is called before each page is requested to
+    pick its `limit`, so that the page size can change along the way.
+    '''
+    params = dict(params or {})
+    params.setdefault('offset', 0)
+    if page_limit is not None:
+        params['limit'] = page_limit()
+    window = _parse_window(params)
+
+    if window is None:
+        first_page = get(url_suffix=url_suffix, params=params)
+    else:
+        first_page = get(url_suffix=url_suffix, params=dict(params, total='true'))
+        total = first_page.get('total')
+        since_dtime, until_dtime = window
+        if total is not None and total > max_offset and until_dtime - since_dtime > MIN_WINDOW:
+            middle_dtime = since_dtime + (until_dtime - since_dtime) / 2
+            LOGGER.info(f"Splitting {url_suffix} window {params['since']} - {params['until']} "
+                        f"holding {total} records in half.")
+            for half_since, half_until in ((since_dtime, middle_dtime), (middle_dtime, until_dtime)):
+                half_params = dict(params,
+                                   offset=0,
+                                   since=datetime.strftime(half_since, DATETIME_FORMAT),
+                                   until=datetime.strftime(half_until, DATETIME_FORMAT))
+                yield from paginate(get, url_suffix, half_params, prefetch=prefetch, max_offset=max_offset, page_limit=page_limit)
+            return
+
+    yield from _walk(get, url_suffix, params, first_page, prefetch, max_offset, page_limit)
+
+
+def _walk(get: Callable[..., Dict],
+          url_suffix: str,
+          params: Dict,
+          page: Dict,
+          prefetch: bool,
+          max_offset: int,
+          page_limit: Optional[Callable[[], int]]) -> Iterator[Dict]:
+    offset = params['offset']
+    limit = params.get('limit', 100)
+    executor = None
+    try:
+        while True:
+            more = page.get('more') is True
+            next_offset = offset + limit
+            next_limit = page_limit() if more and page_limit is not None else limit
+            if more and next_offset + next_limit > max_offset:
+                LOGGER.warning(f"Reached Pagerduty's pagination limit of {max_offset} records for {url_suffix}. "
+                               f"Remaining records can't be fetched without a narrower window.")
+                more = False
+
+            future = None
+            next_params = dict(params, offset=next_offset)
+            if page_limit is not None:
+                next_params['limit'] = next_limit
+            if more and prefetch:
+                if executor is None:
+                    executor = ThreadPoolExecutor(max_workers=1)
+                future = executor.submit(get, url_suffix=url_suffix, params=next_params)
+
+            yield page
+
+            if not more:
+                return
+            page = future.result() if future is not None else get(url_suffix=url_suffix, params=next_params)
+            offset = next_offset
+            limit = next_limit
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Mapping, Optional, Tuple
+
+# Pagerduty allows 960 requests per minute per API token. Stay a little
+# under that so that other clients sharing the token have some headroom.
+DEFAULT_REQUESTS_PER_MINUTE = 900
+DEFAULT_BURST = 10
+
+# A 429 carrying `Retry-After` is retried this many times, the limiter
+# doing the waiting, before falling back to the regular backoff.
+MAX_RETRY_AFTER_ATTEMPTS = 5
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    '''Parses a `Retry-After` header, which may either be a
+    number of seconds or an HTTP date, into seconds to wait.
+    '''
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RateLimiter:
+    '''A thread-safe token bucket shared by every request made against
+    a single Pagerduty API token.
+
+    Tokens refill continuously at `requests_per_minute / 60` per second up
+    to `burst`. Each request takes one token, waiting until it is due.
+    Rate limit headers returned by the API can drain the bucket or pause
+    it entirely, so that the tap slows down before being throttled.
+    '''
+    def __init__(self,
+                 requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 burst: int = DEFAULT_BURST,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive.")
+        if burst < 1:
+            raise ValueError("burst must be at least 1.")
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Mapping) -> 'RateLimiter':
+        return cls(requests_per_minute=config.get('requests_per_minute', DEFAULT_REQUESTS_PER_MINUTE),
+                   burst=config.get('rate_limit_burst', DEFAULT_BURST))
+
+    def _refill(self, now: float):
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def _reserve(self) -> Tuple[bool, float]:
+        with self._lock:
+            now = self.clock()
+            if now < self.paused_until:
+                return False, self.paused_until - now
+            self._refill(now)
+            self.tokens -= 1
+            return True, max(-self.tokens, 0.0) / self.rate
+
+    def _pause_over(self) -> bool:
+        with self._lock:
+            return self.clock() >= self.paused_until
+
+    def acquire(self):
+        '''Blocks until a request may be made. Tokens are reserved
+        up-front, so callers queue up fairly behind one another. If the
+        bucket is paused while a caller is queued, its reservation is
+        dropped and it waits out the pause before queueing again.
+        '''
+        while True:
+            reserved, wait = self._reserve()
+            if reserved and wait <= 0:
+                return
+            self.sleep(wait)
+            if reserved and self._pause_over():
+                return
+
+    async def acquire_async(self):
+        '''Same as `acquire`, but waits on the running event loop
+        instead of blocking the thread.
+        '''
+        while True:
+            reserved, wait = self._reserve()
+            if reserved and wait <= 0:
+                return
+            await asyncio.sleep(wait)
+            if reserved and self._pause_over():
+                return
+
+    def pause(self, seconds: float):
+        '''Stops handing out tokens for `seconds`, e.g. after a 429.
+        A single request is allowed through once the pause is over.
+        '''
+        with self._lock:
+            now = self.clock()
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.tokens = 1.0
+            self.updated_at = self.paused_until
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        '''Reconciles the bucket with the rate limit headers of a response.
+
+        `Retry-After` pauses the bucket outright. `ratelimit-remaining` caps
+        the available tokens, and once it hits zero the bucket is paused
+        until `ratelimit-reset`.
+        '''
+        retry_after = parse_retry_after(headers.get('Retry-After'))
+        if retry_after is not None:
+            self.pause(retry_after)
+            return
+
+        remaining = headers.get('ratelimit-remaining')
+        if remaining is None:
+            return
+        try:
+            remaining_tokens = float(remaining)
+        except ValueError:
+            return
+
+        if remaining_tokens <= 0:
+            reset = parse_retry_after(headers.get('ratelimit-reset'))
+            self.pause(reset if reset is not None else 1 / self.rate)
+        else:
+            with self._lock:
+                self.tokens = min(self.tokens, remaining_tokens)
@@ -0,0 +1,77 @@
+'''Process-wide registry of parsed stream schemas and catalog metadata.
+
+Schemas are read and parsed once per process, however many streams,
+accounts or discovery runs use them. Returned schemas are shared and
+must be copied rather than modified, metadata is handed out as a fresh
+copy since Singer's helpers write to it in place.
+'''
+import copy
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Union
+
+import singer
+
+SCHEMAS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'schemas')
+
+
+@lru_cache(maxsize=None)
+def load_schema(tap_stream_id: str) -> Dict:
+    '''Loads the JSON schema file of a Pagerduty resource.'''
+    return singer.utils.load_json(os.path.join(SCHEMAS_DIR, f"{tap_stream_id}.json"))
+
+
+@lru_cache(maxsize=None)
+def stream_schema(tap_stream_id: str, with_account: bool = False) -> Dict:
+    '''The schema of a stream, with an `account` property when several
+    accounts are synced.
+    '''
+    schema = load_schema(tap_stream_id)
+    if not with_account:
+        return schema
+    return dict(schema, properties=dict(schema['properties'], account={"type": "string"}))
+
+
+def stream_key_properties(key_properties: Union[str, List[str]], with_account: bool = False) -> Union[str, List[str]]:
+    # Streams without keys, like on-calls, can't be upserted on the
+    # account alone, so they stay without keys.
+    if not with_account or not key_properties:
+        return key_properties
+    # Ids are only unique within an account.
+    return ['account', key_properties] if isinstance(key_properties, str) else ['account', *key_properties]
+
+
+@lru_cache(maxsize=None)
+def _standard_metadata(tap_stream_id: str,
+                       with_account: bool,
+                       key_properties: Union[str, tuple],
+                       valid_replication_keys: tuple,
+                       replication_method: str,
+                       replication_key: Optional[str]) -> List[Dict]:
+    metadata = singer.metadata.get_standard_metadata(schema=stream_schema(tap_stream_id, with_account),
+                                                     key_properties=stream_key_properties(key_properties if isinstance(key_properties, str)
+                                                                                          else list(key_properties), with_account),
+                                                     valid_replication_keys=list(valid_replication_keys),
+                                                     replication_method=replication_method)
+    if replication_key is not None:
+        metadata = singer.metadata.to_list(singer.metadata.write(singer.metadata.to_map(metadata),
+                                                                 ('properties', replication_key), 'inclusion', 'automatic'))
+    return metadata
+
+
+def stream_metadata(tap_stream_id: str,
+                    key_properties: Union[str, List[str]],
+                    valid_replication_keys: List[str],
+                    replication_method: str,
+                    replication_key: Optional[str] = None,
+                    with_account: bool = False) -> List[Dict]:
+    '''The standard Singer metadata of a stream, with its replication key
+    always included and `account` added to its key properties, if any,
+    when several accounts are synced.
+    '''
+    return copy.deepcopy(_standard_metadata(tap_stream_id,
+                                            with_account,
+                                            key_properties if isinstance(key_properties, str) else tuple(key_properties),
+                                            tuple(valid_replication_keys),
+                                            replication_method,
+                                            replication_key))
@@ -0,0 +1,49 @@
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_SUBRESOURCE_CONCURRENCY = 8
+
+
+def construct_headers(token: str, email: str) -> Dict:
+    '''Builds the set of HTTP headers sent with
+    every request to the Pagerduty REST API.
+    '''
+    headers = requests.utils.default_headers()
+    headers["Accept"] = "application/vnd.pagerduty+json;version=2"
+    headers["User-Agent"] = "python-pagerduty-tap"
+    headers["Authorization"] = f"Token token= {token}"
+    headers["Content-Type"] = "application/json"
+    headers["From"] = email
+    return headers
+
+
+def required_pool_size(config: Dict) -> int:
+    '''The most connections the streams of an account can have in use at
+    once: `stream_concurrency` streams, each with up to `window_concurrency`
+    listings and `subresource_concurrency` sub-resource listings going.
+    A listing has at most one request in flight, whether it is prefetching
+    the next page or not, as the caller waits on the prefetched page.
+    '''
+    listings = config.get('window_concurrency', 1) + config.get('subresource_concurrency', DEFAULT_SUBRESOURCE_CONCURRENCY)
+    return config.get('stream_concurrency', 1) * listings
+
+
+def create_session(config: Dict) -> requests.Session:
+    '''Creates a keep-alive, connection-pooled Requests session
+    with the Pagerduty headers set once. A single session is meant
+    to be shared by every stream so that connections to the API
+    are reused instead of re-established on every request.
+
+    The pool is never smaller than `required_pool_size`, otherwise the
+    connections of the extra threads would be dropped after each request.
+    '''
+    pool_size = max(config.get('pool_size', DEFAULT_POOL_SIZE), required_pool_size(config))
+    session = requests.Session()
+    session.headers.update(construct_headers(token=config['token'], email=config['email']))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
@@ -1,14 +1,36 @@
 import inspect
-import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import ClassVar, Dict, List, Optional
+from functools import partial
+from itertools import islice
+from typing import (ClassVar, Deque, Dict, Generator, Iterable, Iterator, List,
+                    Optional, Set, Tuple, Union)
 
 import backoff
 import requests
 import singer
 
+from .aio import AsyncEngine
+from .cache import ResponseCache
+from .dedup import RecordDeduplicator
+from .instrumentation import Instrumentation
+from .output import DEFAULT_FLUSH_SIZE, MessageWriter, RecordEmitter
+from .pagesize import MAX_PAGE_SIZE, PageSizes
+from .pagination import DATETIME_FORMAT, paginate
+from .ratelimit import MAX_RETRY_AFTER_ATTEMPTS, RateLimiter, parse_retry_after
+from .registry import (load_schema, stream_key_properties, stream_metadata,
+                       stream_schema)
+from .session import DEFAULT_SUBRESOURCE_CONCURRENCY, create_session
+
 LOGGER = singer.get_logger()
 
+DEFAULT_INCIDENTS_LOOKBACK_DAYS = 30
+DEFAULT_CHECKPOINT_EVERY_RECORDS = 1000
+DEFAULT_CHECKPOINT_INTERVAL_SECONDS = 60
+WINDOW_CHECKPOINT_KEY = 'window_checkpoint'
+
 
 def is_fatal_code(e: requests.exceptions.RequestException) -> bool:
     '''Helper function to determine if a Requests reponse status code
@@ -17,26 +39,82 @@ def is_fatal_code(e: requests.exceptions.RequestException) -> bool:
     return 400 <= e.response.status_code < 500 and e.response.status_code != 429
 
 
+def record_backoff(details: Dict):
+    '''`on_backoff` handler accounting for the time `_get` backs off.'''
+    stream, *args = details['args']
+    url_suffix = details['kwargs'].get('url_suffix', args[0] if args else '')
+    stream.instrumentation.record_retry(url_suffix, details['wait'])
+    if stream.page_sizes is not None:
+        stream.page_sizes.failed(url_suffix)
+
+
 class PagerdutyStream:
+    '''Base of every stream, declared through its class attributes.
+
+    `sync` lists `/{tap_stream_id}` with offset pagination, and emits the
+    records found under the `tap_stream_id` key of each page. Streams
+    without a `replication_key` are listed in full every run, `cacheable`
+    ones through the response cache. Streams with one are listed in
+    `since`/`until` windows no wider than `request_range_limit`, emitting
+    the records at or past their bookmark, which then moves to the latest
+    record once the stream completes. With `bookmark_filters_since`, the
+    bookmark, less `lookback`, also narrows the `since` sent to the API.
+    Subclasses decide which records are new with `is_new`, and may add to
+    each page of them in `prepare_records`.
+    '''
     base_url: ClassVar[str] = "https://api.pagerduty.com"
-    tap_stream_id: ClassVar[Optional[str]] = None
-
-    def __init__(self, config, state):
+    tap_stream_id: ClassVar[str]
+    stream: ClassVar[str]
+    key_properties: ClassVar[Union[str, List[str]]]
+    replication_key: ClassVar[Optional[str]] = None
+    valid_replication_keys: ClassVar[List[str]] = []
+    replication_method: ClassVar[str] = 'FULL_TABLE'
+    valid_params: ClassVar[List[str]] = []
+    required_params: ClassVar[List[str]] = []
+    request_range_limit: ClassVar[timedelta] = timedelta(days=179)
+    cacheable: ClassVar[bool] = False
+    bookmark_filters_since: ClassVar[bool] = False
+    # Whether the top-level `since` is sent along, unless configured
+    # under `streams` anyway.
+    sends_since: ClassVar[bool] = True
+
+    def __init__(self, config, state, session=None, rate_limiter=None, writer=None, cache=None, engine=None, instrumentation=None, page_sizes=None, catalog_entry=None, transform_pool=None, **kwargs):
         self.config = config
         self.token = config.get('token')
         self.email = config.get('email')
         self.state = state
+        self.account = config.get('account')
+        self.bookmark_id = self.tap_stream_id if self.account is None else f"{self.tap_stream_id}:{self.account}"
+        self.base_url = config.get('base_url', self.base_url)
+        self.session = session if session is not None else create_session(config)
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter.from_config(config)
+        self.writer = writer if writer is not None else MessageWriter()
+        self.cache = cache if cache is not None else ResponseCache.from_config(config)
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation.from_config(config)
+        self.page_sizes = page_sizes if page_sizes is not None else PageSizes.from_config(config)
+        self.engine = engine if engine is not None else AsyncEngine.from_config(config, self.rate_limiter, self.cache, self.instrumentation, self.page_sizes)
+        # Worker processes are only started by `sync`, which shares them
+        # between streams and shuts them down once done.
+        self.transform_pool = transform_pool
+        self.lookback = timedelta(0)
+        self._checkpointed_records = 0
+        self._checkpointed_at = time.monotonic()
         self.params = {
-            "limit": config.get('limit', 100),
+            "limit": config.get('limit', MAX_PAGE_SIZE),
             "offset": 0,
             "since": config.get('since'),
             "time_zone": "UTC"
         }
-        self.schema = self.load_schema()
-        self.metadata = singer.metadata.get_standard_metadata(schema=self.load_schema(),
-                                                              key_properties=self.key_properties,
-                                                              valid_replication_keys=self.valid_replication_keys,
-                                                              replication_method=self.replication_method)
+        if not self.sends_since:
+            del self.params["since"]
+        entry = self.catalog_entry(config)
+        self.schema = entry['schema']
+        self.schema_key_properties = entry['key_properties']
+        self.metadata = entry['metadata']
+        self.selected_fields = self.get_selected_fields(catalog_entry)
+        if self.selected_fields is not None:
+            self.schema = dict(self.schema, properties={key: value for key, value in self.schema['properties'].items()
+                                                        if key in self.selected_fields})
 
         config_stream_params = config.get('streams', {}).get(self.tap_stream_id)
 
@@ -50,7 +128,7 @@ class PagerdutyStream:
         for param in self.required_params:
             if param not in self.params.keys():
                 if param == 'until':
-                    self.params.update({"until": datetime.strftime(datetime.utcnow(), '%Y-%m-%dT%H:%M:%SZ')})
+                    self.params.update({"until": datetime.strftime(datetime.utcnow(), DATETIME_FORMAT)})
                 else:
                     raise RuntimeError(f"Parameter '{param}' required but not supplied for /{self.tap_stream_id} endpoint.")
 
@@ -58,50 +136,155 @@ class PagerdutyStream:
         '''Custom get method so that Singer can
         access Class attributes using dict syntax.
         '''
+        if key == 'key_properties':
+            return self.schema_key_properties
         return inspect.getattr_static(self, key, default=None)
 
-    def _get_abs_path(self, path: str) -> str:
-        return os.path.join(os.path.dirname(os.path.realpath(__file__)), path)
-
     def load_schema(self) -> Dict:
         '''Loads a JSON schema file for a given
         Pagerduty resource into a dict representation.
         '''
-        schema_path = self._get_abs_path("schemas")
-        return singer.utils.load_json(f"{schema_path}/{self.tap_stream_id}.json")
+        return load_schema(self.tap_stream_id)
+
+    @classmethod
+    def configured_replication_method(cls, config: Dict) -> str:
+        return cls.replication_method
+
+    @classmethod
+    def catalog_entry(cls, config: Dict) -> Dict:
+        '''Returns the catalog entry of this stream for `config` from the
+        schema registry, without constructing the stream.
+        '''
+        with_account = config.get('account') is not None
+        replication_method = cls.configured_replication_method(config)
+        return {
+            "tap_stream_id": cls.tap_stream_id,
+            "stream": cls.stream,
+            "key_properties": stream_key_properties(cls.key_properties, with_account),
+            "replication_key": cls.replication_key,
+            "replication_method": replication_method,
+            "schema": stream_schema(cls.tap_stream_id, with_account),
+            "metadata": stream_metadata(cls.tap_stream_id,
+                                        key_properties=cls.key_properties,
+                                        valid_replication_keys=cls.valid_replication_keys,
+                                        replication_method=replication_method,
+                                        replication_key=cls.replication_key,
+                                        with_account=with_account),
+        }
+
+    def get_selected_fields(self, catalog_entry) -> Optional[Set[str]]:
+        '''Returns the top-level fields selected in `catalog_entry`, or None
+        when every field is. Fields are only left out when their metadata
+        explicitly deselects them, or marks them as unsupported. Fields
+        with `automatic` inclusion are always kept.
+        '''
+        if catalog_entry is None:
+            return None
+        metadata = singer.metadata.to_map(catalog_entry.metadata)
+        deselected = set()
+        for breadcrumb, field_metadata in metadata.items():
+            if len(breadcrumb) != 2 or breadcrumb[0] != 'properties' or breadcrumb[1] == self.replication_key:
+                continue
+            inclusion = field_metadata.get('inclusion')
+            if inclusion == 'unsupported' or (inclusion != 'automatic' and field_metadata.get('selected') is False):
+                deselected.add(breadcrumb[1])
+        if not deselected:
+            return None
+        return set(self.schema['properties']) - deselected
 
     def write_schema(self):
         '''Writes a Singer schema message.'''
-        return singer.write_schema(stream_name=self.stream, schema=self.schema, key_properties=self.key_properties)
+        return self.writer.write_schema(stream_name=self.stream, schema=self.schema, key_properties=self.schema_key_properties)
 
     def write_state(self):
-        return singer.write_state(self.state)
+        return self.writer.write_state(self.state)
+
+    def record_emitter(self):
+        '''Returns the emit stage records of this stream are written through.'''
+        return RecordEmitter(writer=self.writer,
+                             stream_name=self.stream,
+                             schema=self.schema,
+                             flush_size=self.config.get('output_flush_size', DEFAULT_FLUSH_SIZE),
+                             instrumentation=self.instrumentation,
+                             fields=self.selected_fields,
+                             extra_fields=None if self.account is None else {"account": self.account},
+                             transform_pool=self.transform_pool)
+
+    def deduplicator(self) -> Optional[RecordDeduplicator]:
+        '''Returns the stage dropping records already emitted this sync,
+        or None for records without a single `id` to key them on.
+        '''
+        if not isinstance(self.key_properties, str):
+            return None
+        return RecordDeduplicator.from_config(self.config, self.key_properties, self.replication_key)
 
-    def _construct_headers(self) -> Dict:
-        headers = requests.utils.default_headers()
-        headers["Accept"] = "application/vnd.pagerduty+json;version=2"
-        headers["User-Agent"] = "python-pagerduty-tap"
-        headers["Authorization"] = f"Token token= {self.token}"
-        headers["Content-Type"] = "application/json"
-        headers["From"] = self.email
-        return headers
+    def log_duplicates(self, deduplicator: Optional[RecordDeduplicator]):
+        if deduplicator is not None and deduplicator.duplicates:
+            LOGGER.info(f"Dropped {deduplicator.duplicates} duplicate /{self.tap_stream_id} records.")
 
     @backoff.on_exception(backoff.fibo,
                           requests.exceptions.HTTPError,
                           max_time=120,
                           giveup=is_fatal_code,
+                          on_backoff=record_backoff,
                           logger=LOGGER)
     @backoff.on_exception(backoff.fibo,
                           (requests.exceptions.ConnectionError,
                            requests.exceptions.Timeout),
                           max_time=120,
+                          on_backoff=record_backoff,
                           logger=LOGGER)
-    def _get(self, url_suffix: str, params: Dict = None) -> Dict:
+    def _get(self, url_suffix: str, params: Dict = None, cacheable: bool = False, immutable: bool = False) -> Dict:
+        '''Makes a rate limited GET request. A 429 carrying a `Retry-After`
+        header pauses the shared rate limiter and is retried straight away,
+        the limiter doing the waiting, so that the Fibonacci backoff only
+        kicks in once those retries are exhausted.
+
+        With a response cache configured, `cacheable` responses are served
+        from it while fresh and revalidated with a conditional request once
+        stale. `immutable` responses never go stale.
+        '''
         url = self.base_url + url_suffix
-        headers = self._construct_headers()
-        response = requests.get(url, headers=headers, params=params)
+        cache_key = None
+        cached = None
+        headers: Dict[str, str] = {}
+        if self.cache is not None and cacheable:
+            cache_key = self.cache.key(url, params, namespace=self.account)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                if cached.fresh:
+                    return cached.body
+                headers = cached.conditional_headers()
+
+        for _ in range(MAX_RETRY_AFTER_ATTEMPTS):
+            self.rate_limiter.acquire()
+            started_at = time.perf_counter()
+            response = self.session.get(url, params=params, headers=headers)
+            seconds = time.perf_counter() - started_at
+            self.instrumentation.record_request(url_suffix, seconds, response.status_code, len(response.content))
+            self.rate_limiter.update_from_headers(response.headers)
+            if response.status_code != 429 or 'Retry-After' not in response.headers:
+                break
+            self.instrumentation.record_retry(url_suffix, parse_retry_after(response.headers['Retry-After']) or 0.0)
+
+        if response.status_code == 304 and cache_key is not None and cached is not None:
+            self.cache.refresh(cache_key)
+            return cached.body
+
         response.raise_for_status()
-        return response.json()
+        body = response.json()
+        if self.page_sizes is not None:
+            self.page_sizes.observe(url_suffix, params, seconds, len(response.content), body)
+        if cache_key is not None:
+            self.cache.put(cache_key, body,
+                           etag=response.headers.get('ETag'),
+                           last_modified=response.headers.get('Last-Modified'),
+                           immutable=immutable)
+        return body
+
+    def _get_async(self, url_suffix: str, params: Optional[Dict] = None, cacheable: bool = False, immutable: bool = False) -> Dict:
+        '''Same as `_get`, but made through the asyncio engine.'''
+        return self.engine.run(self.engine.get(self.base_url + url_suffix, params=params, cacheable=cacheable, immutable=immutable))
 
     def update_bookmark(self, bookmark, value):
         if bookmark is None:
@@ -110,41 +293,183 @@ class PagerdutyStream:
             new_bookmark = max(bookmark, value)
         return new_bookmark
 
-    def _list_resource(self, url_suffix: str, params: Dict = None):
-        response = self._get(url_suffix=url_suffix, params=params)
-        return PagerdutyResponse(self, url_suffix, params, response)
-
-
-class PagerdutyResponse:
-    def __init__(self, client, url_suffix, params, response):
-        self.client = client
-        self.url_suffix = url_suffix
-        self.params = params
-        self.response = response
+    def _window_bounds(self) -> List[Tuple[datetime, datetime]]:
+        '''Splits the `since`/`until` range into consecutive windows no
+        wider than the endpoint allows, or than `window_size_days` if set.
+        '''
+        since_dtime = datetime.strptime(self.params.get("since"), DATETIME_FORMAT)
+        until_dtime = datetime.strptime(self.params.get("until"), DATETIME_FORMAT)
+        window_checkpoint = singer.bookmarks.get_bookmark(state=self.state,
+                                                          tap_stream_id=self.bookmark_id,
+                                                          key=WINDOW_CHECKPOINT_KEY)
+        if window_checkpoint is not None:
+            LOGGER.info(f"Resuming /{self.tap_stream_id} from the window ending {window_checkpoint}.")
+            since_dtime = max(since_dtime, datetime.strptime(window_checkpoint, DATETIME_FORMAT))
+        window_size = self.request_range_limit
+        if self.config.get('window_size_days') is not None:
+            window_size = min(timedelta(days=self.config['window_size_days']), window_size)
+
+        windows = []
+        while since_dtime < until_dtime:
+            windows.append((since_dtime, min(since_dtime + window_size, until_dtime)))
+            since_dtime += window_size
+        return windows
+
+    def checkpoint_window(self, until_dtime: datetime, emitter: RecordEmitter):
+        '''Records that every window up to `until_dtime` has been emitted, so
+        that an interrupted sync resumes from there instead of the start.
+
+        A STATE message is only written once `checkpoint_every_records`
+        records or `checkpoint_interval_seconds` have gone by since the last.
+        Bookmarks themselves are only advanced once the stream completes.
+        '''
+        every_records = self.config.get('checkpoint_every_records', DEFAULT_CHECKPOINT_EVERY_RECORDS)
+        interval = self.config.get('checkpoint_interval_seconds', DEFAULT_CHECKPOINT_INTERVAL_SECONDS)
+        now = time.monotonic()
+        if emitter.emitted - self._checkpointed_records < every_records and now - self._checkpointed_at < interval:
+            return
+
+        emitter.flush()
+        self.writer.write_bookmark(state=self.state,
+                                   tap_stream_id=self.bookmark_id,
+                                   key=WINDOW_CHECKPOINT_KEY,
+                                   val=datetime.strftime(until_dtime, DATETIME_FORMAT))
+        self.write_state()
+        self._checkpointed_records = emitter.emitted
+        self._checkpointed_at = now
+
+    def clear_window_checkpoint(self):
+        self.writer.clear_bookmark(state=self.state, tap_stream_id=self.bookmark_id, key=WINDOW_CHECKPOINT_KEY)
+
+    def _list_window(self, since_dtime: datetime, until_dtime: datetime) -> Iterator[Dict]:
+        '''Yields every record of a single `since`/`until` window.'''
+        params = dict(self.params)
+        params.update({
+            "offset": 0,
+            "since": datetime.strftime(since_dtime, DATETIME_FORMAT),
+            "until": datetime.strftime(until_dtime, DATETIME_FORMAT)
+        })
+        for page in self._list_resource(url_suffix=f"/{self.tap_stream_id}", params=params):
+            yield from page[self.tap_stream_id]
+
+    def _fetch_window(self, since_dtime: datetime, until_dtime: datetime) -> List[Dict]:
+        records = list(self._list_window(since_dtime, until_dtime))
+        records.sort(key=lambda record: record[self.replication_key])
+        return records
+
+    def _iter_windows(self) -> Iterator[Tuple[datetime, datetime, Iterable[Dict]]]:
+        '''Yields `(since, until, records)` for each window, in chronological order.
+
+        With `window_concurrency` above 1, up to that many windows are
+        fetched ahead on a thread pool and each window's records are merged
+        back in replication key order. Otherwise records are streamed page
+        by page in the order the API returns them.
+        '''
+        windows = self._window_bounds()
+        window_concurrency = self.config.get('window_concurrency', 1)
+        if window_concurrency <= 1:
+            for since_dtime, until_dtime in windows:
+                yield since_dtime, until_dtime, self._list_window(since_dtime, until_dtime)
+            return
+
+        with ThreadPoolExecutor(max_workers=window_concurrency) as executor:
+            pending: Deque = deque()
+            for since_dtime, until_dtime in windows:
+                pending.append((since_dtime, until_dtime, executor.submit(self._fetch_window, since_dtime, until_dtime)))
+                if len(pending) >= window_concurrency:
+                    window_since, window_until, future = pending.popleft()
+                    yield window_since, window_until, future.result()
+            while pending:
+                window_since, window_until, future = pending.popleft()
+                yield window_since, window_until, future.result()
+
+    def _list_resource(self,
+                       url_suffix: str,
+                       params: Dict = None,
+                       cacheable: bool = False,
+                       immutable: bool = False,
+                       prefetch: Optional[bool] = None) -> Generator[Dict, None, None]:
+        get = partial(self._get if self.engine is None else self._get_async, cacheable=cacheable, immutable=immutable)
+        if prefetch is None:
+            prefetch = self.config.get('prefetch_pages', True)
+        page_limit = None
+        if self.page_sizes is not None:
+            page_limit = self.page_sizes.limiter(url_suffix, (params or {}).get('limit', MAX_PAGE_SIZE))
+        return paginate(get, url_suffix, params, prefetch=prefetch, page_limit=page_limit)
 
-    def __iter__(self):
-        self._iteration = 0
-        return self
+    def sync(self):
+        if self.replication_key is None:
+            self._sync_full_table()
+        else:
+            self._sync_windows()
 
-    def __next__(self):
-        self._iteration += 1
-        if self._iteration == 1:
-            return self
+    def _sync_full_table(self):
+        with singer.metrics.job_timer(job_type=f"list_{self.tap_stream_id}"):
+            with singer.metrics.record_counter(endpoint=self.tap_stream_id) as counter, self.record_emitter() as emitter:
+                for page in self._list_resource(url_suffix=f"/{self.tap_stream_id}", params=self.params, cacheable=self.cacheable):
+                    for record in page[self.tap_stream_id]:
+                        emitter.emit(record)
+                        counter.increment()
+
+    def is_new(self, record: Dict, bookmark_dtime: Optional[datetime]) -> bool:
+        '''Whether a record changed since the last incremental run.'''
+        if bookmark_dtime is None:
+            return True
+        return datetime.strptime(record[self.replication_key], DATETIME_FORMAT) >= bookmark_dtime
+
+    def prepare_records(self, records: List[Dict]) -> Iterable[Dict]:
+        '''Called with each page worth of new records before they are
+        emitted, e.g. to fetch what else they embed.
+        '''
+        return records
 
-        if self.response.get("more") is False:
-            raise StopIteration
+    def _sync_windows(self):
+        incremental = self.replication_method == 'INCREMENTAL'
+        current_bookmark = None
+        if incremental:
+            current_bookmark = singer.bookmarks.get_bookmark(state=self.state,
+                                                             tap_stream_id=self.bookmark_id,
+                                                             key=self.replication_key,
+                                                             default=None)
 
-        if self.response.get("more") is True:
-            self.params["offset"] += self.params["limit"]
-            self.response = self.client._get(
-                url_suffix=self.url_suffix, params=self.params
-            )
-            return self
+        if current_bookmark is not None:
+            current_bookmark_dtime = datetime.strptime(current_bookmark, DATETIME_FORMAT)
+            if self.bookmark_filters_since:
+                since_dtime = datetime.strptime(self.params["since"], DATETIME_FORMAT)
+                self.params["since"] = datetime.strftime(max(since_dtime, current_bookmark_dtime - self.lookback), DATETIME_FORMAT)
         else:
-            raise StopIteration
+            current_bookmark_dtime = None
 
-    def get(self, key, default=None):
-        return self.response.get(key, default)
+        running_bookmark_dtime = current_bookmark_dtime
+        deduplicator = self.deduplicator()
+        with singer.metrics.job_timer(job_type=f"list_{self.tap_stream_id}"):
+            with singer.metrics.record_counter(endpoint=self.tap_stream_id) as counter, self.record_emitter() as emitter:
+                for _, window_until, window_records in self._iter_windows():
+                    window_iterator = iter(window_records)
+                    while True:
+                        page = list(islice(window_iterator, self.params["limit"]))
+                        if not page:
+                            break
+                        records = [record for record in page if self.is_new(record, current_bookmark_dtime)]
+                        if deduplicator is not None:
+                            # Duplicates are dropped before `prepare_records` fetches anything for them.
+                            records = [record for record in records if not deduplicator.is_duplicate(record)]
+                        for record in self.prepare_records(records):
+                            emitter.emit(record)
+                            counter.increment()
+                            if incremental:
+                                record_replication_key_dtime = datetime.strptime(record[self.replication_key], DATETIME_FORMAT)
+                                running_bookmark_dtime = self.update_bookmark(running_bookmark_dtime, record_replication_key_dtime)
+                    self.checkpoint_window(window_until, emitter)
+
+        self.log_duplicates(deduplicator)
+        self.clear_window_checkpoint()
+        if incremental and running_bookmark_dtime is not None:
+            running_bookmark_str = datetime.strftime(running_bookmark_dtime, DATETIME_FORMAT)
+            self.writer.write_bookmark(state=self.state,
+                                       tap_stream_id=self.bookmark_id,
+                                       key=self.replication_key,
+                                       val=running_bookmark_str)
 
 
 class IncidentsStream(PagerdutyStream):
@@ -169,81 +494,124 @@ class IncidentsStream(PagerdutyStream):
         'include[]'
     ]
     required_params: ClassVar[List[str]] = ['until']
+    request_range_limit: ClassVar[timedelta] = timedelta(days=179)
+    bookmark_filters_since: ClassVar[bool] = True
+    subresources: ClassVar[List[str]] = ['log_entries', 'alerts']
 
-    def __init__(self, config, state, **kwargs):
-        super().__init__(config, state)
+    @classmethod
+    def configured_replication_method(cls, config: Dict) -> str:
+        replication_method = config.get('incidents_replication_method', cls.replication_method)
+        if replication_method not in ('FULL_TABLE', 'INCREMENTAL'):
+            raise RuntimeError(f"Unsupported replication method '{replication_method}' for /{cls.tap_stream_id}.")
+        return replication_method
 
-    def sync(self):
-        current_bookmark = singer.bookmarks.get_bookmark(state=self.state,
-                                                         tap_stream_id=self.tap_stream_id,
-                                                         key=self.replication_key,
-                                                         default=None)
+    def __init__(self, config, state, **kwargs):
+        self.replication_method = self.configured_replication_method(config)
+        super().__init__(config, state, **kwargs)
+        # The API filters incidents on their creation date, so incremental
+        # runs start a lookback period before the bookmark to pick up
+        # incidents that were created earlier but changed since.
+        self.lookback = timedelta(days=config.get('incidents_lookback_days', DEFAULT_INCIDENTS_LOOKBACK_DAYS))
+        self.subresource_concurrency = config.get('subresource_concurrency', DEFAULT_SUBRESOURCE_CONCURRENCY)
+        self.subresource_max_items = config.get('subresource_max_items')
+        if not config.get('embed_log_entries', True):
+            self.subresources = [subresource for subresource in self.subresources if subresource != 'log_entries']
+        if self.selected_fields is not None:
+            self.subresources = [subresource for subresource in self.subresources if subresource in self.selected_fields]
+
+    def _list_subresource(self, incident_id: str, subresource: str, immutable: bool = False) -> List[Dict]:
+        '''Walks every page of an incident's sub-resource listing
+        (e.g. `/incidents/{id}/alerts`) and returns the combined records.
+        Listings that can no longer change are cached as `immutable`.
+
+        With `subresource_max_items` set, pagination stops once that many
+        records have been read and the rest are dropped.
+        '''
+        items: List[Dict] = []
+        pages = self._list_resource(url_suffix=f"/{self.tap_stream_id}/{incident_id}/{subresource}",
+                                    params=self._subresource_params(),
+                                    cacheable=immutable,
+                                    immutable=immutable,
+                                    prefetch=None if self.subresource_max_items is None else False)
+        for page in pages:
+            items.extend(page[subresource])
+            if self.subresource_max_items is not None and len(items) >= self.subresource_max_items:
+                if len(items) > self.subresource_max_items or page.get('more') is True:
+                    LOGGER.warning(f"Truncated {subresource} of incident {incident_id} to {self.subresource_max_items} records.")
+                del items[self.subresource_max_items:]
+                pages.close()
+                break
+        return items
+
+    def _subresource_params(self) -> Dict:
+        return {
+            "limit": MAX_PAGE_SIZE if self.subresource_max_items is None else max(min(MAX_PAGE_SIZE, self.subresource_max_items), 1),
+            "offset": 0,
+            "time_zone": "UTC"
+        }
 
-        if current_bookmark is not None:
-            current_bookmark_dtime = datetime.strptime(current_bookmark, '%Y-%m-%dT%H:%M:%SZ')
-        else:
-            current_bookmark_dtime = None
+    def _fetch_subresources(self, executor: Executor, records: List[Dict]) -> Iterator[Dict[str, List[Dict]]]:
+        '''Fetches the sub-resources of a page of incidents concurrently,
+        yielding them in the same order as `records`. The asyncio engine
+        awaits all of them at once instead of going through `executor`.
+        '''
+        if self.engine is not None:
+            yield from self._gather_subresources(records)
+            return
+
+        futures = [
+            {subresource: executor.submit(self._list_subresource, record['id'], subresource, self._is_immutable(record, subresource))
+             for subresource in self.subresources}
+            for record in records
+        ]
+        for record_futures in futures:
+            yield {subresource: future.result() for subresource, future in record_futures.items()}
+
+    def _gather_subresources(self, records: List[Dict]) -> Iterator[Dict[str, List[Dict]]]:
+        params = self._subresource_params()
+        coroutines = [
+            self.engine.list_all(f"{self.base_url}/{self.tap_stream_id}/{record['id']}/{subresource}",
+                                 key=subresource,
+                                 params=params,
+                                 cacheable=self._is_immutable(record, subresource),
+                                 immutable=self._is_immutable(record, subresource),
+                                 max_items=self.subresource_max_items)
+            for record in records
+            for subresource in self.subresources
+        ]
+        results = iter(self.engine.run(self.engine.gather(coroutines)))
+        for _ in records:
+            yield {subresource: next(results) for subresource in self.subresources}
+
+    def _is_immutable(self, record: Dict, subresource: str) -> bool:
+        '''A resolved incident never gains new alerts.'''
+        return subresource == 'alerts' and record.get('status') == 'resolved'
+
+    def is_new(self, record: Dict, bookmark_dtime: Optional[datetime]) -> bool:
+        '''Incidents that were already resolved as of the last incremental run
+        can't change any more, so they are neither re-fetched nor re-emitted.
+        Any other incident from the lookback period is.
+        '''
+        if self.replication_method != 'INCREMENTAL' or bookmark_dtime is None:
+            return True
+        record_replication_key_dtime = datetime.strptime(record[self.replication_key], DATETIME_FORMAT)
+        return record.get('status') != 'resolved' or record_replication_key_dtime >= bookmark_dtime
 
-        since_dtime = datetime.strptime(self.params.get("since"), '%Y-%m-%dT%H:%M:%SZ')
-        until_dtime = datetime.strptime(self.params.get("until"), '%Y-%m-%dT%H:%M:%SZ')
-        request_range_limit = timedelta(days=179)
+    def prepare_records(self, records: List[Dict]) -> Iterable[Dict]:
+        for record, subresources in zip(records, self._fetch_subresources(self._subresource_executor, records)):
+            record.update(subresources)
+            yield record
 
-        running_bookmark_dtime = None
-        with singer.metrics.job_timer(job_type=f"list_{self.tap_stream_id}"):
-            with singer.metrics.record_counter(endpoint=self.tap_stream_id) as counter:
-                while since_dtime < until_dtime:
-                    range = {
-                        "offset": 0,  # Reset the offset each time.
-                        "since": datetime.strftime(since_dtime, '%Y-%m-%dT%H:%M:%SZ'),
-                        "until": datetime.strftime(min(since_dtime + request_range_limit, until_dtime), '%Y-%m-%dT%H:%M:%SZ')
-                    }
-                    self.params.update(range)
-                    for page in self._list_resource(url_suffix=f"/{self.tap_stream_id}", params=self.params):
-                        for record in page.get(self.tap_stream_id):
-                            record_replication_key_dtime = datetime.strptime(record.get(self.replication_key), '%Y-%m-%dT%H:%M:%SZ')
-
-                            substream_params = {
-                                "limit": 100,
-                                "offset": 0,
-                                "time_zone": "UTC"
-                            }
-                            record['log_entries'] = []
-                            for page in self._list_resource(url_suffix=f"/{self.tap_stream_id}/{record.get('id')}/log_entries", params=substream_params):
-                                record['log_entries'].extend(page.get('log_entries'))
-
-                            record['alerts'] = []
-                            for page in self._list_resource(url_suffix=f"/{self.tap_stream_id}/{record.get('id')}/alerts", params=substream_params):
-                                record['alerts'].extend(page.get('alerts'))
-
-                            if self.replication_method == 'INCREMENTAL':
-                                if (current_bookmark_dtime is None) or (record_replication_key_dtime >= current_bookmark_dtime):
-                                    with singer.Transformer() as transformer:
-                                        transformed_record = transformer.transform(data=record, schema=self.schema)
-                                        singer.write_record(stream_name=self.stream, time_extracted=singer.utils.now(), record=transformed_record)
-                                        counter.increment()
-                                        running_bookmark_dtime = self.update_bookmark(running_bookmark_dtime, record_replication_key_dtime)
-                            else:
-                                with singer.Transformer() as transformer:
-                                    transformed_record = transformer.transform(data=record, schema=self.schema)
-                                    singer.write_record(stream_name=self.stream, time_extracted=singer.utils.now(), record=transformed_record)
-                                    counter.increment()
-
-                    since_dtime += request_range_limit
-
-        if self.replication_method == 'INCREMENTAL':
-            running_bookmark_str = datetime.strftime(running_bookmark_dtime, '%Y-%m-%dT%H:%M:%SZ')
-            singer.bookmarks.write_bookmark(state=self.state,
-                                            tap_stream_id=self.tap_stream_id,
-                                            key=self.replication_key,
-                                            val=running_bookmark_str)
+    def sync(self):
+        with ThreadPoolExecutor(max_workers=self.subresource_concurrency) as executor:
+            self._subresource_executor = executor
+            super().sync()
 
 
 class EscalationPoliciesStream(PagerdutyStream):
     tap_stream_id: ClassVar[str] = 'escalation_policies'
     stream: ClassVar[str] = 'escalation_policies'
     key_properties: ClassVar[str] = 'id'
-    valid_replication_keys: ClassVar[List[str]] = []
-    replication_method: ClassVar[str] = 'FULL_TABLE'
     valid_params: ClassVar[List[str]] = [
         'user_ids[]',
         'team_ids[]',
@@ -251,28 +619,13 @@ class EscalationPoliciesStream(PagerdutyStream):
         'query',
         'include[]',
     ]
-    required_params: ClassVar[List[str]] = []
-
-    def __init__(self, config, state, **kwargs):
-        super().__init__(config, state)
-
-    def sync(self):
-        with singer.metrics.job_timer(job_type=f"list_{self.tap_stream_id}"):
-            with singer.metrics.record_counter(endpoint=self.tap_stream_id) as counter:
-                for page in self._list_resource(url_suffix=f"/{self.tap_stream_id}", params=self.params):
-                    for record in page.get(self.tap_stream_id):
-                        with singer.Transformer() as transformer:
-                            transformed_record = transformer.transform(data=record, schema=self.schema)
-                            singer.write_record(stream_name=self.stream, time_extracted=singer.utils.now(), record=transformed_record)
-                            counter.increment()
+    cacheable: ClassVar[bool] = True
 
 
 class ServicesStream(PagerdutyStream):
     tap_stream_id: ClassVar[str] = 'services'
     stream: ClassVar[str] = 'services'
     key_properties: ClassVar[str] = 'id'
-    valid_replication_keys: ClassVar[List[str]] = []
-    replication_method: ClassVar[str] = 'FULL_TABLE'
     valid_params: ClassVar[List[str]] = [
         'team_ids[]',
         'time_zone',
@@ -280,21 +633,7 @@ class ServicesStream(PagerdutyStream):
         'query',
         'include[]',
     ]
-    required_params: ClassVar[List[str]] = []
-
-    def __init__(self, config, state, **kwargs):
-        super().__init__(config, state)
-
-    def sync(self):
-
-        with singer.metrics.job_timer(job_type=f"list_{self.tap_stream_id}"):
-            with singer.metrics.record_counter(endpoint=self.tap_stream_id) as counter:
-                for page in self._list_resource(url_suffix=f"/{self.tap_stream_id}", params=self.params):
-                    for record in page.get(self.tap_stream_id):
-                        with singer.Transformer() as transformer:
-                            transformed_record = transformer.transform(data=record, schema=self.schema)
-                            singer.write_record(stream_name=self.stream, time_extracted=singer.utils.now(), record=transformed_record)
-                            counter.increment()
+    cacheable: ClassVar[bool] = True
 
 
 class NotificationsStream(PagerdutyStream):
@@ -306,57 +645,75 @@ class NotificationsStream(PagerdutyStream):
     replication_method: ClassVar[str] = 'INCREMENTAL'
     valid_params: ClassVar[List[str]] = ['time_zone', 'since', 'until', 'filter', 'include']
     required_params: ClassVar[List[str]] = ['since', 'until']
+    request_range_limit: ClassVar[timedelta] = timedelta(days=89)
 
-    def __init__(self, config, state, **kwargs):
-        super().__init__(config, state)
 
-    def sync(self):
-        current_bookmark = singer.bookmarks.get_bookmark(state=self.state,
-                                                         tap_stream_id=self.tap_stream_id,
-                                                         key=self.replication_key,
-                                                         default=None)
+class LogEntriesStream(PagerdutyStream):
+    tap_stream_id: ClassVar[str] = 'log_entries'
+    stream: ClassVar[str] = 'log_entries'
+    key_properties: ClassVar[str] = 'id'
+    replication_key: ClassVar[str] = 'created_at'
+    valid_replication_keys: ClassVar[List[str]] = ['created_at']
+    replication_method: ClassVar[str] = 'INCREMENTAL'
+    valid_params: ClassVar[List[str]] = ['time_zone', 'since', 'until', 'is_overview', 'include[]', 'team_ids[]']
+    required_params: ClassVar[List[str]] = ['since', 'until']
+    # The account-wide listing filters on created_at, so the bookmark can
+    # be pushed down to the API.
+    bookmark_filters_since: ClassVar[bool] = True
 
-        if current_bookmark is not None:
-            current_bookmark_dtime = datetime.strptime(current_bookmark, '%Y-%m-%dT%H:%M:%SZ')
-        else:
-            current_bookmark_dtime = None
 
-        since_dtime = datetime.strptime(self.params.get("since"), '%Y-%m-%dT%H:%M:%SZ')
-        until_dtime = datetime.strptime(self.params.get("until"), '%Y-%m-%dT%H:%M:%SZ')
-        request_range_limit = timedelta(days=89)
+class UsersStream(PagerdutyStream):
+    tap_stream_id: ClassVar[str] = 'users'
+    stream: ClassVar[str] = 'users'
+    key_properties: ClassVar[str] = 'id'
+    valid_params: ClassVar[List[str]] = ['query', 'team_ids[]', 'include[]']
+    cacheable: ClassVar[bool] = True
 
-        running_bookmark_dtime = None
-        with singer.metrics.job_timer(job_type=f"list_{self.tap_stream_id}"):
-            with singer.metrics.record_counter(endpoint=self.tap_stream_id) as counter:
-                while since_dtime < until_dtime:
-                    range = {
-                        "offset": 0,  # Reset the offset each time.
-                        "since": datetime.strftime(since_dtime, '%Y-%m-%dT%H:%M:%SZ'),
-                        "until": datetime.strftime(min(since_dtime + request_range_limit, until_dtime), '%Y-%m-%dT%H:%M:%SZ')
-                    }
-                    self.params.update(range)
-                    for page in self._list_resource(url_suffix=f"/{self.tap_stream_id}", params=self.params):
-                        for record in page.get(self.tap_stream_id):
-                            record_replication_key_dtime = datetime.strptime(record.get(self.replication_key), '%Y-%m-%dT%H:%M:%SZ')
-                            if (current_bookmark_dtime is None) or (record_replication_key_dtime >= current_bookmark_dtime):
-                                with singer.Transformer() as transformer:
-                                    transformed_record = transformer.transform(data=record, schema=self.schema)
-                                    singer.write_record(stream_name=self.stream, time_extracted=singer.utils.now(), record=transformed_record)
-                                    counter.increment()
-                                    running_bookmark_dtime = self.update_bookmark(running_bookmark_dtime, record_replication_key_dtime)
-
-                    since_dtime += request_range_limit
-
-        running_bookmark_str = datetime.strftime(running_bookmark_dtime, '%Y-%m-%dT%H:%M:%SZ')
-        singer.bookmarks.write_bookmark(state=self.state,
-                                        tap_stream_id=self.tap_stream_id,
-                                        key=self.replication_key,
-                                        val=running_bookmark_str)
+
+class TeamsStream(PagerdutyStream):
+    tap_stream_id: ClassVar[str] = 'teams'
+    stream: ClassVar[str] = 'teams'
+    key_properties: ClassVar[str] = 'id'
+    valid_params: ClassVar[List[str]] = ['query']
+    cacheable: ClassVar[bool] = True
+
+
+class SchedulesStream(PagerdutyStream):
+    tap_stream_id: ClassVar[str] = 'schedules'
+    stream: ClassVar[str] = 'schedules'
+    key_properties: ClassVar[str] = 'id'
+    valid_params: ClassVar[List[str]] = ['query', 'include[]', 'time_zone']
+    cacheable: ClassVar[bool] = True
+
+
+class OncallsStream(PagerdutyStream):
+    tap_stream_id: ClassVar[str] = 'oncalls'
+    stream: ClassVar[str] = 'oncalls'
+    # On-call entries have no id of their own.
+    key_properties: ClassVar[List[str]] = []
+    valid_params: ClassVar[List[str]] = [
+        'time_zone',
+        'include[]',
+        'user_ids[]',
+        'escalation_policy_ids[]',
+        'schedule_ids[]',
+        'since',
+        'until',
+        'earliest',
+    ]
+    # Without `since`, the endpoint lists who is on call right now. With
+    # it, `until` is required and the range can't exceed three months.
+    sends_since: ClassVar[bool] = False
 
 
 AVAILABLE_STREAMS = {
     IncidentsStream,
     ServicesStream,
     NotificationsStream,
-    EscalationPoliciesStream
+    EscalationPoliciesStream,
+    LogEntriesStream,
+    UsersStream,
+    TeamsStream,
+    SchedulesStream,
+    OncallsStream
 }
@@ -0,0 +1,180 @@
+import copy
+import re
+from typing import Any, Callable, Dict, Optional, Set
+
+import singer
+from singer.transform import string_to_datetime
+
+# Pagerduty timestamps already look like this, and only need the fractional
+# seconds Singer writes added, instead of a round trip through dateutil.
+_UTC_TIMESTAMP = re.compile(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z$')
+
+_MISS = object()
+
+Transform = Callable[[Any], Any]
+
+
+class _Mismatch(Exception):
+    '''Raised when a value fits none of the types its schema allows.'''
+
+
+class _Unsupported(Exception):
+    '''Raised at compile time for schema keywords the compiler doesn't handle.'''
+
+
+def _identity(data: Any) -> Any:
+    return data
+
+
+def _null(data: Any) -> Any:
+    return None if data is None or data == "" else _MISS
+
+
+def _date_time(data: Any) -> Any:
+    if data is None or data == "":
+        return _MISS
+    if isinstance(data, str) and _UTC_TIMESTAMP.match(data):
+        return data[:-1] + '.000000Z'
+    transformed = string_to_datetime(data)
+    return _MISS if transformed is None else transformed
+
+
+def _string(data: Any) -> Any:
+    return _MISS if data is None else str(data)
+
+
+def _integer(data: Any) -> Any:
+    if isinstance(data, str):
+        data = data.replace(",", "")
+    try:
+        return int(data)
+    except Exception:
+        return _MISS
+
+
+def _number(data: Any) -> Any:
+    if isinstance(data, str):
+        data = data.replace(",", "")
+    try:
+        return float(data)
+    except Exception:
+        return _MISS
+
+
+def _boolean(data: Any) -> Any:
+    if isinstance(data, str) and data.lower() == "false":
+        return False
+    try:
+        return bool(data)
+    except Exception:
+        return _MISS
+
+
+def _compile_object(properties: Dict, path: str, removed: Set[str]) -> Transform:
+    if properties == {}:
+        return lambda data: data if isinstance(data, dict) else _MISS
+
+    property_transforms = {key: _compile(value, f"{path}.{key}" if path else key, removed)
+                           for key, value in properties.items()}
+
+    def transform_object(data: Any) -> Any:
+        if not isinstance(data, dict):
+            return _MISS
+        result = {}
+        for key, value in data.items():
+            property_transform = property_transforms.get(key)
+            if property_transform is None:
+                removed.add(f"{path}.{key}" if path else key)
+            else:
+                result[key] = property_transform(value)
+        return result
+    return transform_object
+
+
+def _compile_array(items: Dict, path: str, removed: Set[str]) -> Transform:
+    item_transform = _compile(items, path, removed)
+
+    def transform_array(data: Any) -> Any:
+        if not isinstance(data, list):
+            return _MISS
+        return [item_transform(item) for item in data]
+    return transform_array
+
+
+def _compile_type(typ: str, schema: Dict, path: str, removed: Set[str]) -> Transform:
+    # Same precedence as singer.Transformer._transform.
+    if typ == "null":
+        return _null
+    if schema.get("format") == "date-time":
+        return _date_time
+    if typ == "object":
+        return _compile_object(schema.get("properties", {}), path, removed)
+    if typ == "array":
+        return _compile_array(schema["items"], path, removed)
+    return {"string": _string, "integer": _integer, "number": _number, "boolean": _boolean}.get(typ, lambda data: _MISS)
+
+
+def _compile(schema: Dict, path: str, removed: Set[str]) -> Transform:
+    if "anyOf" in schema or "patternProperties" in schema:
+        raise _Unsupported()
+    if "type" not in schema:
+        return _identity
+
+    types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+    types = [typ for typ in types if typ != "null"] + (["null"] if "null" in types else [])
+    attempts = [_compile_type(typ, schema, path, removed) for typ in types]
+
+    def transform(data: Any) -> Any:
+        for attempt in attempts:
+            try:
+                transformed = attempt(data)
+            except _Mismatch:
+                continue
+            if transformed is not _MISS:
+                return transformed
+        raise _Mismatch()
+
+    if len(attempts) == 1:
+        attempt = attempts[0]
+
+        def transform_single(data: Any) -> Any:
+            transformed = attempt(data)
+            if transformed is _MISS:
+                raise _Mismatch()
+            return transformed
+        return transform_single
+    return transform
+
+
+class CompiledTransformer:
+    '''Transforms records against a schema compiled once into a tree of
+    closures, giving the same output as `singer.Transformer` without
+    re-walking the schema for every record.
+
+    Schemas using `anyOf` or `patternProperties` are left to
+    `singer.Transformer`, as is any record the compiled transform can't
+    handle, so that Singer still reports the schema mismatch.
+    '''
+    def __init__(self, schema: Dict):
+        # singer.Transformer reorders `type` lists in place, and schemas
+        # may be shared through the registry.
+        self.schema = copy.deepcopy(schema)
+        self.transformer = singer.Transformer()
+        self.removed: Set[str] = set()
+        self._transform: Optional[Transform]
+        try:
+            self._transform = _compile(schema, '', self.removed)
+        except _Unsupported:
+            self._transform = None
+
+    def transform(self, record: Dict) -> Dict:
+        if self._transform is not None:
+            try:
+                return self._transform(record)
+            except _Mismatch:
+                pass
+        return self.transformer.transform(data=record, schema=self.schema)
+
+    def log_warning(self):
+        self.transformer.removed |= self.removed
+        self.transformer.log_warning()
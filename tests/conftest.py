@@ -1,9 +1,12 @@
 import json
 
 import pytest
+import singer
 
 from tap_pagerduty.streams import (EscalationPoliciesStream, IncidentsStream,
-                                   NotificationsStream, ServicesStream)
+                                   LogEntriesStream, NotificationsStream,
+                                   OncallsStream, SchedulesStream,
+                                   ServicesStream, TeamsStream, UsersStream)
 
 
 @pytest.fixture(scope='function')
@@ -18,9 +21,32 @@ def state(shared_datadir):
         return json.load(f)
 
 
-@pytest.fixture(scope='function', params={IncidentsStream, ServicesStream, NotificationsStream, EscalationPoliciesStream})
+@pytest.fixture(scope='function', params={IncidentsStream, ServicesStream, NotificationsStream, EscalationPoliciesStream, LogEntriesStream,
+                                          UsersStream, TeamsStream, SchedulesStream, OncallsStream})
 def client(config, state, shared_datadir, request):
     return request.param(token=config.get("token"),
                          email=config.get("email"),
                          config=config,
                          state=state)
+
+
+@pytest.fixture
+def read_records(capsys):
+    '''Reads the records of a stream from the Singer messages written so far.'''
+    def read(stream_name):
+        messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        return [message['record'] for message in messages if message['type'] == 'RECORD' and message['stream'] == stream_name]
+    return read
+
+
+@pytest.fixture
+def build_catalog():
+    '''Builds a catalog with the given stream classes selected.'''
+    def build(config, stream_classes):
+        entries = []
+        for stream_class in stream_classes:
+            entry = stream_class.catalog_entry(config)
+            metadata = singer.metadata.write(singer.metadata.to_map(entry['metadata']), (), 'selected', True)
+            entries.append(dict(entry, metadata=singer.metadata.to_list(metadata)))
+        return singer.catalog.Catalog.from_dict({"streams": entries})
+    return build
@@ -0,0 +1,86 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Set
+from urllib.parse import urlparse
+
+import pytest
+
+from tap_pagerduty.aio import AsyncEngine
+from tap_pagerduty.ratelimit import RateLimiter
+from tap_pagerduty.streams import IncidentsStream
+
+pytest.importorskip('aiohttp')
+
+
+class Handler(BaseHTTPRequestHandler):
+    incidents = [{"id": f"P{i}", "last_status_change_at": "2019-01-01T12:00:00Z"} for i in range(20)]
+    throttled: Set[str] = set()
+
+    def do_GET(self):
+        path = urlparse(self.path).path.strip('/').split('/')
+        if path == ['incidents']:
+            body = {"incidents": self.incidents, "more": False}
+        else:
+            _, incident_id, subresource = path
+            if self.path not in self.throttled:
+                # Throttle every first request for a sub-resource.
+                self.throttled.add(self.path)
+                self.send_response(429)
+                self.send_header('Retry-After', '0')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            body = {subresource: [{"id": f"{incident_id}-{subresource}"}], "more": False}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    '''Same as http.server.ThreadingHTTPServer, which needs Python 3.7.'''
+    daemon_threads = True
+
+
+@pytest.fixture
+def base_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_engine_from_config(config):
+    rate_limiter = RateLimiter.from_config(config)
+    assert AsyncEngine.from_config(config, rate_limiter) is None
+    assert isinstance(AsyncEngine.from_config(dict(config, engine='asyncio'), rate_limiter), AsyncEngine)
+    with pytest.raises(RuntimeError):
+        AsyncEngine.from_config(dict(config, engine='gevent'), rate_limiter)
+
+
+def test_asyncio_engine_syncs_incidents(config, state, base_url, read_records):
+    config['since'] = '2019-01-01T00:00:00Z'
+    config['streams']['incidents']['until'] = '2019-01-02T00:00:00Z'
+    config['engine'] = 'asyncio'
+    config['base_url'] = base_url
+    config['requests_per_minute'] = 60000
+    stream = IncidentsStream(config=config, state=state)
+    try:
+        stream.sync()
+    finally:
+        stream.engine.close()
+
+    records = read_records('incidents')
+    assert [record['id'] for record in records] == [incident['id'] for incident in Handler.incidents]
+    for record in records:
+        assert record['alerts'] == [{"id": f"{record['id']}-alerts"}]
+        assert record['log_entries'] == [{"id": f"{record['id']}-log_entries"}]
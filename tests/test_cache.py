@@ -0,0 +1,40 @@
+import responses
+
+from tap_pagerduty.cache import ResponseCache
+from tap_pagerduty.streams import ServicesStream
+
+
+def test_cache_expires_and_evicts(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / 'cache.sqlite'), ttl_seconds=0, max_bytes=60)
+    cache.put('a', {"value": "a" * 10})
+    cache.put('b', {"value": "b" * 10}, immutable=True)
+    assert cache.get('a').fresh is False
+    assert cache.get('b').fresh is True
+
+    cache.put('c', {"value": "c" * 10})
+    assert cache.get('a') is None
+    assert cache.get('c').body == {"value": "c" * 10}
+
+
+def test_cache_key_ignores_param_order():
+    assert ResponseCache.key('/x', {"b": 1, "a": 2}) == ResponseCache.key('/x', {"a": 2, "b": 1})
+
+
+def test_services_served_from_cache_and_revalidated(config, state, tmp_path):
+    config['cache'] = {'path': str(tmp_path / 'cache.sqlite')}
+    expected = {"services": [{"id": "P1"}], "more": False}
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, "https://api.pagerduty.com/services", json=expected, headers={"ETag": '"v1"'})
+        for _ in range(2):
+            stream = ServicesStream(config=config, state=state)
+            assert list(stream._list_resource(url_suffix="/services", params=stream.params, cacheable=True)) == [expected]
+        assert len(rsps.calls) == 1
+
+    stream.cache.ttl_seconds = 0
+    key = stream.cache.key(f"{stream.base_url}/services", dict(stream.params))
+    stream.cache.put(key, expected, etag='"v1"')
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, "https://api.pagerduty.com/services", status=304)
+        assert stream._get(url_suffix="/services", params=dict(stream.params), cacheable=True) == expected
+        assert rsps.calls[0].request.headers["If-None-Match"] == '"v1"'
@@ -3,7 +3,10 @@ import requests
 import responses
 from singer.schema import Schema
 
-from tap_pagerduty.streams import is_fatal_code
+from tap_pagerduty.ratelimit import RateLimiter
+from tap_pagerduty.session import create_session
+from tap_pagerduty.streams import (AVAILABLE_STREAMS, ServicesStream,
+                                   is_fatal_code)
 
 
 @pytest.mark.parametrize('status_code', [400, 401, 403, 404,
@@ -22,6 +25,8 @@ def test_load_schema(client):
     schema = client.load_schema()
     assert isinstance(schema, dict)
     assert Schema.from_dict(schema)
+    # Parsed once per process and shared by every stream.
+    assert client.load_schema() is schema
 
 
 def test_get_successful(client):
@@ -42,3 +47,62 @@ def test_get_fatal(client, status_code):
                  json=expected, status=status_code)
         resp = client._get(url_suffix=f"/{client.tap_stream_id}")
         assert resp == expected
+
+
+def test_session_shared_across_streams(config, state):
+    session = create_session(config)
+    streams = [stream(config=config, state=state, session=session) for stream in AVAILABLE_STREAMS]
+    assert all(stream.session is session for stream in streams)
+    assert session.headers["Authorization"] == f"Token token= {config['token']}"
+    assert session.headers["From"] == config["email"]
+
+
+class CountingRateLimiter(RateLimiter):
+    def __init__(self, **kwargs):
+        self.acquired = 0
+        self.sleeps = []
+        self.now = 0.0
+        super().__init__(clock=lambda: self.now, sleep=self._sleep, **kwargs)
+
+    def _sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def acquire(self):
+        self.acquired += 1
+        super().acquire()
+
+
+def test_get_goes_through_rate_limiter(config, state):
+    limiter = CountingRateLimiter()
+    stream = ServicesStream(config=config, state=state, rate_limiter=limiter)
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, f"{stream.base_url}/services", json={}, status=200,
+                 headers={"ratelimit-remaining": "2"})
+        stream._get(url_suffix="/services")
+    assert limiter.acquired == 1
+    assert limiter.tokens <= 2
+
+
+def test_get_honors_retry_after(config, state):
+    limiter = CountingRateLimiter()
+    stream = ServicesStream(config=config, state=state, rate_limiter=limiter)
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, f"{stream.base_url}/services", json={}, status=429, headers={"Retry-After": "5"})
+        rsps.add(responses.GET, f"{stream.base_url}/services", json={"services": []}, status=200)
+        assert stream._get(url_suffix="/services") == {"services": []}
+    assert limiter.acquired == 2
+    assert limiter.sleeps == [pytest.approx(5.0)]
+
+
+def test_session_pool_fits_subresource_concurrency(config):
+    config['subresource_concurrency'] = 25
+    adapter = create_session(config).get_adapter('https://api.pagerduty.com')
+    assert adapter._pool_maxsize == 26
+
+
+def test_session_pool_fits_concurrent_streams_and_windows(config):
+    config.update(stream_concurrency=5, window_concurrency=3, subresource_concurrency=8)
+    adapter = create_session(config).get_adapter('https://api.pagerduty.com')
+    assert adapter._pool_maxsize == 55
+    assert create_session({"token": "t", "email": "e"}).get_adapter('https://api.pagerduty.com')._pool_maxsize == 10
@@ -0,0 +1,23 @@
+from tap_pagerduty.dedup import RecordDeduplicator
+
+
+def test_duplicates_keyed_on_id_and_replication_key():
+    deduplicator = RecordDeduplicator('id', 'started_at')
+    assert not deduplicator.is_duplicate({"id": "P1", "started_at": "2019-01-01T00:00:00Z"})
+    assert deduplicator.is_duplicate({"id": "P1", "started_at": "2019-01-01T00:00:00Z"})
+    assert not deduplicator.is_duplicate({"id": "P1", "started_at": "2019-01-02T00:00:00Z"})
+    assert deduplicator.duplicates == 1
+
+
+def test_least_recently_seen_keys_are_forgotten():
+    deduplicator = RecordDeduplicator('id', capacity=2)
+    for record_id in ("P1", "P2", "P1", "P3"):
+        deduplicator.is_duplicate({"id": record_id})
+    assert len(deduplicator.seen) == 2
+    assert deduplicator.is_duplicate({"id": "P1"})
+    assert not deduplicator.is_duplicate({"id": "P2"})
+
+
+def test_disabled_with_zero_capacity():
+    assert RecordDeduplicator.from_config({"dedup_capacity": 0}, 'id') is None
+    assert RecordDeduplicator.from_config({}, 'id').capacity == 100000
@@ -0,0 +1,47 @@
+import json
+
+import responses
+
+from tap_pagerduty.instrumentation import Instrumentation, endpoint_template
+from tap_pagerduty.streams import IncidentsStream
+
+
+def test_endpoint_template():
+    assert endpoint_template('/incidents') == '/incidents'
+    assert endpoint_template('/incidents/PABC123/alerts') == '/incidents/{id}/alerts'
+    assert endpoint_template('/incidents/Q1X2/log_entries?offset=100') == '/incidents/{id}/log_entries'
+
+
+def test_latency_percentiles():
+    instrumentation = Instrumentation(log_requests=False)
+    for millis in range(1, 101):
+        instrumentation.record_request('/services', millis / 1000, 200, 10)
+
+    stats = instrumentation.summary()['endpoints']['/services']
+    assert stats['requests'] == 100
+    assert stats['bytes_received'] == 1000
+    assert stats['latency_max'] == 0.1
+    assert 0.05 <= stats['latency_p50'] < 0.05 * 1.25
+    assert 0.09 <= stats['latency_p90'] < 0.09 * 1.25
+    assert 0.099 <= stats['latency_p99'] <= 0.1
+
+
+def test_get_records_requests_and_throttling(config, state, tmp_path):
+    instrumentation = Instrumentation(log_requests=False)
+    stream = IncidentsStream(config=config, state=state, instrumentation=instrumentation)
+    body = {"alerts": [], "more": False}
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, f"{stream.base_url}/incidents/P1/alerts", status=429, headers={"Retry-After": "0"})
+        rsps.add(responses.GET, f"{stream.base_url}/incidents/P1/alerts", json=body)
+        rsps.add(responses.GET, f"{stream.base_url}/incidents/P2/alerts", json=body)
+        stream._get(url_suffix='/incidents/P1/alerts')
+        stream._get(url_suffix='/incidents/P2/alerts')
+
+    instrumentation.dump(str(tmp_path / 'metrics.json'))
+    with open(tmp_path / 'metrics.json') as f:
+        stats = json.load(f)['endpoints']['/incidents/{id}/alerts']
+    assert stats['requests'] == 3
+    assert stats['throttled'] == 1
+    assert stats['retries'] == 1
+    assert stats['bytes_received'] == 2 * len(json.dumps(body))
@@ -0,0 +1,83 @@
+import copy
+import io
+
+import pytest
+import singer
+from singer.transform import SchemaMismatch
+
+from tap_pagerduty.output import MessageWriter, RecordEmitter, TransformPool
+from tap_pagerduty.registry import stream_schema
+from tap_pagerduty.transform import CompiledTransformer
+
+SCHEMA = {
+    "type": ["null", "object"],
+    "properties": {
+        "id": {"type": ["null", "string"]},
+        "count": {"type": ["null", "integer"]},
+        "ratio": {"type": ["null", "number"]},
+        "enabled": {"type": ["null", "boolean"]},
+        "created_at": {"type": ["null", "string"], "format": "date-time"},
+        "tags": {"type": ["null", "array"], "items": {"type": ["null", "string"]}},
+        "body": {"type": ["null", "object"], "properties": {}},
+        "nested": {"type": ["null", "object"], "properties": {"at": {"type": ["null", "string"], "format": "date-time"}}}
+    }
+}
+
+
+@pytest.mark.parametrize('record', [
+    {"id": "P1", "count": "1,024", "ratio": "0.5", "enabled": "false", "created_at": "2019-01-01T00:00:00Z"},
+    {"id": 12, "count": 3.0, "enabled": 1, "created_at": "2019-01-01T00:00:00-08:00", "tags": ["a", None]},
+    {"id": "", "created_at": "", "body": {"anything": [1, 2]}, "nested": {"at": None, "dropped": True}, "unknown": 1},
+    {"id": None, "nested": None, "tags": None},
+])
+def test_compiled_transform_matches_singer(record):
+    expected = singer.Transformer().transform(data=copy.deepcopy(record), schema=copy.deepcopy(SCHEMA))
+    assert CompiledTransformer(copy.deepcopy(SCHEMA)).transform(copy.deepcopy(record)) == expected
+
+
+def test_compiled_transform_falls_back_on_mismatch():
+    with pytest.raises(SchemaMismatch):
+        CompiledTransformer(copy.deepcopy(SCHEMA)).transform({"count": "not a number"})
+
+
+def test_fallback_leaves_registry_schemas_untouched():
+    schema = stream_schema('services')
+    types = list(schema['properties']['id']['type'])
+    with pytest.raises(SchemaMismatch):
+        CompiledTransformer(schema).transform({"id": "P1", "auto_resolve_timeout": "not a number"})
+    assert stream_schema('services')['properties']['id']['type'] == types
+
+
+def test_record_emitter_buffers_singer_messages():
+    out = io.StringIO()
+    with RecordEmitter(writer=MessageWriter(out=out), stream_name='things', schema=SCHEMA, flush_size=2) as emitter:
+        for i in range(3):
+            emitter.emit({"id": f"P{i}", "created_at": "2019-01-01T00:00:00Z"})
+            assert out.getvalue().count('\n') == (i + 1) // 2 * 2
+    messages = [singer.parse_message(line) for line in out.getvalue().splitlines()]
+    assert [message.record['id'] for message in messages] == ['P0', 'P1', 'P2']
+    assert all(message.stream == 'things' and message.time_extracted is not None for message in messages)
+    assert messages[0].record['created_at'] == '2019-01-01T00:00:00.000000Z'
+
+
+def test_record_emitter_transforms_on_pool_in_order():
+    records = [{"id": f"P{i}", "count": str(i), "created_at": "2019-01-01T00:00:00Z", "unknown": i} for i in range(25)]
+    expected = io.StringIO()
+    with RecordEmitter(writer=MessageWriter(out=expected), stream_name='things', schema=SCHEMA) as emitter:
+        for record in copy.deepcopy(records):
+            emitter.emit(record)
+
+    out = io.StringIO()
+    pool = TransformPool(workers=2, chunk_size=3)
+    try:
+        with RecordEmitter(writer=MessageWriter(out=out), stream_name='things', schema=SCHEMA, flush_size=4, transform_pool=pool) as emitter:
+            for record in copy.deepcopy(records):
+                emitter.emit(record)
+    finally:
+        pool.close()
+
+    messages = [singer.parse_message(line) for line in out.getvalue().splitlines()]
+    assert [message.record for message in messages] == [message.record for message in map(singer.parse_message, expected.getvalue().splitlines())]
+    assert messages[3].record == {"id": "P3", "count": 3, "created_at": "2019-01-01T00:00:00.000000Z"}
+    assert emitter.emitted == 25
+    assert emitter.transformer.removed == {'unknown'}
@@ -0,0 +1,35 @@
+from tap_pagerduty.pagesize import AdaptivePageSize, PageSizes
+
+
+def test_page_size_shrinks_on_slow_large_or_failed_pages():
+    page_size = AdaptivePageSize(latency_target=1.0, max_bytes=1000)
+    page_size.observe(100, seconds=2.0, size_bytes=10, records=100)
+    assert page_size.limit == 50
+    page_size.observe(50, seconds=0.1, size_bytes=5000, records=50)
+    assert page_size.limit == 25
+    page_size.failed()
+    page_size.failed()
+    assert page_size.limit == 10
+
+
+def test_page_size_grows_back_on_fast_full_pages():
+    page_size = AdaptivePageSize(latency_target=1.0)
+    page_size.failed()
+    assert page_size.limit == 50
+    page_size.observe(50, seconds=0.8, size_bytes=10, records=50)
+    assert page_size.limit == 50
+    # A short last page says nothing about larger ones.
+    page_size.observe(50, seconds=0.1, size_bytes=10, records=3)
+    assert page_size.limit == 50
+    for _ in range(10):
+        page_size.observe(page_size.limit, seconds=0.1, size_bytes=10, records=page_size.limit)
+    assert page_size.limit == 100
+
+
+def test_page_sizes_per_endpoint_template():
+    page_sizes = PageSizes(latency_target=1.0)
+    page_sizes.observe('/incidents/P1/alerts', {"limit": 100}, seconds=5.0, size_bytes=10, body={"alerts": [], "more": False})
+    assert page_sizes.limit('/incidents/P2/alerts') == 50
+    assert page_sizes.limit('/incidents/P2/log_entries') == 100
+    assert page_sizes.limiter('/incidents/P2/alerts', maximum=20)() == 20
+    assert PageSizes.from_config({}) is None
@@ -0,0 +1,55 @@
+import pytest
+
+from tap_pagerduty.pagination import paginate
+
+
+class FakeListing:
+    '''Serves `ids` for any window, `limit` records per page.'''
+    def __init__(self, count):
+        self.count = count
+        self.calls = []
+
+    def __call__(self, url_suffix, params):
+        self.calls.append(dict(params))
+        offset, limit = params['offset'], params['limit']
+        page = {"items": list(range(offset, min(offset + limit, self.count))),
+                "more": offset + limit < self.count}
+        if params.get('total') == 'true':
+            page['total'] = self.count
+        return page
+
+
+@pytest.mark.parametrize('prefetch', [True, False])
+def test_paginate_walks_all_pages_without_mutating_params(prefetch):
+    listing = FakeListing(count=250)
+    params = {"limit": 100, "offset": 0}
+    items = [item for page in paginate(listing, '/items', params, prefetch=prefetch) for item in page['items']]
+    assert items == list(range(250))
+    assert params == {"limit": 100, "offset": 0}
+    assert [call['offset'] for call in listing.calls] == [0, 100, 200]
+
+
+def test_paginate_splits_windows_past_offset_ceiling():
+    class WindowedListing(FakeListing):
+        def __call__(self, url_suffix, params):
+            # Each day of the window holds 30 records.
+            days = int(params['until'][8:10]) - int(params['since'][8:10])
+            self.count = days * 30
+            return super().__call__(url_suffix, params)
+
+    listing = WindowedListing(count=0)
+    params = {"limit": 10, "since": "2019-01-01T00:00:00Z", "until": "2019-01-05T00:00:00Z"}
+    pages = list(paginate(listing, '/items', params, max_offset=60))
+    windows = sorted({(call['since'], call['until']) for call in listing.calls})
+    assert windows == [("2019-01-01T00:00:00Z", "2019-01-03T00:00:00Z"),
+                       ("2019-01-01T00:00:00Z", "2019-01-05T00:00:00Z"),
+                       ("2019-01-03T00:00:00Z", "2019-01-05T00:00:00Z")]
+    assert sum(len(page['items']) for page in pages) == 120
+
+
+def test_paginate_page_limit_changes_page_size():
+    listing = FakeListing(count=100)
+    limits = iter([40, 20, 20, 20])
+    items = [item for page in paginate(listing, '/items', {"limit": 100}, page_limit=lambda: next(limits)) for item in page['items']]
+    assert items == list(range(100))
+    assert [(call['offset'], call['limit']) for call in listing.calls] == [(0, 40), (40, 20), (60, 20), (80, 20)]
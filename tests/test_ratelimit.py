@@ -0,0 +1,62 @@
+import pytest
+
+from tap_pagerduty.ratelimit import RateLimiter, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_burst_then_steady_rate(clock):
+    limiter = RateLimiter(requests_per_minute=60, burst=3, clock=clock, sleep=clock.sleep)
+    for _ in range(5):
+        limiter.acquire()
+    assert clock.sleeps == [pytest.approx(1.0), pytest.approx(1.0)]
+
+
+def test_retry_after_pauses_bucket(clock):
+    limiter = RateLimiter(requests_per_minute=600, burst=5, clock=clock, sleep=clock.sleep)
+    limiter.update_from_headers({'Retry-After': '30'})
+    limiter.acquire()
+    assert clock.sleeps == [pytest.approx(30.0)]
+
+
+def test_exhausted_ratelimit_headers_pause_until_reset(clock):
+    limiter = RateLimiter(requests_per_minute=600, burst=5, clock=clock, sleep=clock.sleep)
+    limiter.update_from_headers({'ratelimit-remaining': '0', 'ratelimit-reset': '12'})
+    limiter.acquire()
+    assert clock.now == pytest.approx(12.0)
+
+
+@pytest.mark.parametrize('value, expected', [(None, None), ('5', 5.0), ('-1', 0.0), ('garbage', None)])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_pause_while_queued_holds_back_reservation(clock):
+    limiter = RateLimiter(requests_per_minute=60, burst=1, clock=clock, sleep=clock.sleep)
+    limiter.acquire()
+
+    def sleep(seconds):
+        # Another worker receives a 429 while this caller is queued.
+        if not clock.sleeps:
+            limiter.pause(30)
+        clock.sleep(seconds)
+
+    limiter.sleep = sleep
+    limiter.acquire()
+    assert clock.now == pytest.approx(30.0)
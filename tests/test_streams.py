@@ -0,0 +1,206 @@
+import json
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+import responses
+
+from tap_pagerduty.streams import (IncidentsStream, LogEntriesStream,
+                                   NotificationsStream, OncallsStream,
+                                   UsersStream)
+
+
+def test_incidents_fetch_subresources_in_order(config, state, read_records):
+    config['since'] = '2019-01-01T00:00:00Z'
+    config['streams']['incidents']['until'] = '2019-01-02T00:00:00Z'
+    config['subresource_concurrency'] = 4
+    stream = IncidentsStream(config=config, state=state)
+    incidents = [{"id": f"P{i}", "last_status_change_at": "2019-01-01T12:00:00Z"} for i in range(5)]
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, f"{stream.base_url}/incidents", json={"incidents": incidents, "more": False})
+        for incident in incidents:
+            for subresource in stream.subresources:
+                rsps.add(responses.GET, f"{stream.base_url}/incidents/{incident['id']}/{subresource}",
+                         json={subresource: [{"id": f"{incident['id']}-{subresource}"}], "more": False})
+        stream.sync()
+
+    records = read_records('incidents')
+    assert [record['id'] for record in records] == [incident['id'] for incident in incidents]
+    for record in records:
+        assert record['alerts'] == [{"id": f"{record['id']}-alerts"}]
+        assert record['log_entries'] == [{"id": f"{record['id']}-log_entries"}]
+
+
+def test_notifications_sharded_windows_merge_in_order(config, state, read_records):
+    config['since'] = '2019-11-01T00:00:00Z'
+    config['window_size_days'] = 1
+    config['window_concurrency'] = 3
+    config['streams'] = {'notifications': {'until': '2019-11-05T00:00:00Z'}}
+    stream = NotificationsStream(config=config, state=state)
+
+    def callback(request):
+        since = parse_qs(urlparse(request.url).query)['since'][0][:10]
+        records = [{"id": f"{since}-{hour}", "started_at": f"{since}T{hour:02d}:00:00Z"} for hour in (20, 3, 11)]
+        return 200, {}, json.dumps({"notifications": records, "more": False})
+
+    with responses.RequestsMock() as rsps:
+        rsps.add_callback(responses.GET, f"{stream.base_url}/notifications", callback=callback)
+        stream.sync()
+
+    started_at = [record['started_at'] for record in read_records('notifications')]
+    assert len(started_at) == 12
+    assert started_at == sorted(started_at)
+    assert state['bookmarks']['notifications']['started_at'] == '2019-11-04T20:00:00Z'
+
+
+def test_incremental_incidents_skip_unchanged_resolved(config, state, read_records):
+    config['since'] = '2019-01-01T00:00:00Z'
+    config['streams']['incidents']['until'] = '2019-11-01T00:00:00Z'
+    config['incidents_replication_method'] = 'INCREMENTAL'
+    config['incidents_lookback_days'] = 10
+    state['bookmarks']['incidents'] = {'last_status_change_at': '2019-10-20T00:00:00Z'}
+    stream = IncidentsStream(config=config, state=state)
+    incidents = [
+        {"id": "OLD", "status": "resolved", "last_status_change_at": "2019-10-19T00:00:00Z"},
+        {"id": "OPEN", "status": "triggered", "last_status_change_at": "2019-10-15T00:00:00Z"},
+        {"id": "NEW", "status": "resolved", "last_status_change_at": "2019-10-25T00:00:00Z"},
+    ]
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, f"{stream.base_url}/incidents", json={"incidents": incidents, "more": False})
+        for incident_id in ("OPEN", "NEW"):
+            for subresource in stream.subresources:
+                rsps.add(responses.GET, f"{stream.base_url}/incidents/{incident_id}/{subresource}",
+                         json={subresource: [], "more": False})
+        stream.sync()
+        since = parse_qs(urlparse(rsps.calls[0].request.url).query)['since'][0]
+
+    assert since == '2019-10-10T00:00:00Z'
+    assert [record['id'] for record in read_records('incidents')] == ["OPEN", "NEW"]
+    assert state['bookmarks']['incidents']['last_status_change_at'] == '2019-10-25T00:00:00Z'
+
+
+def test_log_entries_start_from_bookmark(config, state, read_records):
+    config['since'] = '2019-01-01T00:00:00Z'
+    config['streams'] = {'log_entries': {'until': '2019-11-01T00:00:00Z'}}
+    state['bookmarks']['log_entries'] = {'created_at': '2019-10-20T00:00:00Z'}
+    stream = LogEntriesStream(config=config, state=state)
+    log_entries = [{"id": f"R{day}", "created_at": f"2019-10-{day}T00:00:00Z"} for day in (20, 21, 22)]
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, f"{stream.base_url}/log_entries", json={"log_entries": log_entries, "more": False})
+        stream.sync()
+        since = parse_qs(urlparse(rsps.calls[0].request.url).query)['since'][0]
+
+    assert since == '2019-10-20T00:00:00Z'
+    assert [record['id'] for record in read_records('log_entries')] == ["R20", "R21", "R22"]
+    assert state['bookmarks']['log_entries']['created_at'] == '2019-10-22T00:00:00Z'
+
+
+def test_incidents_without_embedded_log_entries(config, state):
+    config['embed_log_entries'] = False
+    assert IncidentsStream(config=config, state=state).subresources == ['alerts']
+
+
+def test_notifications_resume_from_window_checkpoint(config, state, capsys):
+    config['since'] = '2019-11-01T00:00:00Z'
+    config['window_size_days'] = 1
+    config['checkpoint_every_records'] = 1
+    config['streams'] = {'notifications': {'until': '2019-11-05T00:00:00Z'}}
+    requested = []
+
+    def callback(request):
+        since = parse_qs(urlparse(request.url).query)['since'][0]
+        requested.append(since)
+        if since == '2019-11-03T00:00:00Z' and len(requested) < 4:
+            return 404, {}, ''
+        return 200, {}, json.dumps({"notifications": [{"id": since, "started_at": since}], "more": False})
+
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        rsps.add_callback(responses.GET, f"{NotificationsStream.base_url}/notifications", callback=callback)
+        with pytest.raises(requests.exceptions.HTTPError):
+            NotificationsStream(config=config, state=state).sync()
+        assert state['bookmarks']['notifications']['window_checkpoint'] == '2019-11-03T00:00:00Z'
+        assert json.loads(capsys.readouterr().out.splitlines()[-1])['type'] == 'STATE'
+
+        NotificationsStream(config=config, state=state).sync()
+
+    assert requested == ['2019-11-01T00:00:00Z', '2019-11-02T00:00:00Z', '2019-11-03T00:00:00Z',
+                         '2019-11-03T00:00:00Z', '2019-11-04T00:00:00Z']
+    assert 'window_checkpoint' not in state['bookmarks']['notifications']
+
+
+def test_incident_subresources_truncated(config, state, read_records):
+    config['since'] = '2019-01-01T00:00:00Z'
+    config['streams']['incidents']['until'] = '2019-01-02T00:00:00Z'
+    config['subresource_max_items'] = 3
+    stream = IncidentsStream(config=config, state=state)
+
+    def callback(request):
+        query = parse_qs(urlparse(request.url).query)
+        assert query['limit'] == ['3']
+        return 200, {}, json.dumps({"alerts": [{"id": f"A{i}"} for i in range(3)], "more": True})
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, f"{stream.base_url}/incidents",
+                 json={"incidents": [{"id": "P1", "last_status_change_at": "2019-01-01T12:00:00Z"}], "more": False})
+        rsps.add_callback(responses.GET, f"{stream.base_url}/incidents/P1/alerts", callback=callback)
+        rsps.add(responses.GET, f"{stream.base_url}/incidents/P1/log_entries",
+                 json={"log_entries": [{"id": "L1"}], "more": False})
+        stream.sync()
+        assert len([call for call in rsps.calls if '/alerts' in call.request.url]) == 1
+
+    record, = read_records('incidents')
+    assert record['alerts'] == [{"id": "A0"}, {"id": "A1"}, {"id": "A2"}]
+    assert record['log_entries'] == [{"id": "L1"}]
+
+
+def test_incidents_on_window_bounds_are_emitted_once(config, state, read_records):
+    config['since'] = '2019-01-01T00:00:00Z'
+    config['streams']['incidents']['until'] = '2019-01-03T00:00:00Z'
+    config['window_size_days'] = 1
+    stream = IncidentsStream(config=config, state=state)
+    # Both windows include their shared bound.
+    incident = {"id": "P1", "last_status_change_at": "2019-01-02T00:00:00Z"}
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, f"{stream.base_url}/incidents", json={"incidents": [incident], "more": False})
+        for subresource in stream.subresources:
+            rsps.add(responses.GET, f"{stream.base_url}/incidents/P1/{subresource}", json={subresource: [], "more": False})
+        stream.sync()
+        requested = [urlparse(call.request.url).path for call in rsps.calls]
+
+    assert [record['id'] for record in read_records('incidents')] == ["P1"]
+    assert requested.count('/incidents') == 2
+    assert requested.count('/incidents/P1/alerts') == 1
+
+
+def test_users_listed_in_full(config, state, read_records):
+    stream = UsersStream(config=config, state=state)
+    pages = [[{"id": f"U{i}", "email": f"user{i}@example.com"} for i in range(start, start + 100)] for start in (0, 100)]
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, f"{stream.base_url}/users", json={"users": pages[0], "offset": 0, "limit": 100, "more": True})
+        rsps.add(responses.GET, f"{stream.base_url}/users", json={"users": pages[1], "offset": 100, "limit": 100, "more": False})
+        stream.sync()
+
+    assert [record['id'] for record in read_records('users')] == [f"U{i}" for i in range(200)]
+    assert 'users' not in state.get('bookmarks', {})
+
+
+def test_oncalls_without_key_properties_or_since(config, state, capsys):
+    stream = OncallsStream(config=config, state=state)
+    oncall = {"user": {"id": "U1"}, "escalation_level": 1, "start": "2019-01-01T00:00:00Z", "end": None}
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, f"{stream.base_url}/oncalls", json={"oncalls": [oncall, oncall], "more": False})
+        stream.write_schema()
+        stream.sync()
+        query = parse_qs(urlparse(rsps.calls[0].request.url).query)
+
+    assert 'since' not in query
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert messages[0]['type'] == 'SCHEMA' and messages[0]['key_properties'] == []
+    records = [message['record'] for message in messages if message['type'] == 'RECORD']
+    assert [record['user'] for record in records] == [{"id": "U1"}, {"id": "U1"}]
@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+from collections import Counter
+
+import responses
+import singer
+
+import tap_pagerduty
+from tap_pagerduty import discover, sync
+from tap_pagerduty.streams import (EscalationPoliciesStream, IncidentsStream,
+                                   NotificationsStream, OncallsStream,
+                                   ServicesStream)
+
+
+def test_discover_matches_streams_without_building_them(config, capsys, monkeypatch):
+    def create_session(config):
+        raise AssertionError("discovery set up a session")
+
+    monkeypatch.setattr(tap_pagerduty.streams, 'create_session', create_session)
+    discover(config=config)
+
+    entries = {entry['tap_stream_id']: entry for entry in json.loads(capsys.readouterr().out)['streams']}
+    monkeypatch.undo()
+    stream = IncidentsStream(config=config, state={})
+    assert entries['incidents']['schema'] == stream.schema
+    assert singer.metadata.to_map(entries['incidents']['metadata']) == singer.metadata.to_map(stream.metadata)
+    assert entries['incidents']['key_properties'] == 'id'
+    assert entries['incidents']['replication_key'] == 'last_status_change_at'
+
+
+def test_parallel_stream_sync(config, state, capsys, build_catalog):
+    config['stream_concurrency'] = 2
+    catalog = build_catalog(config, [ServicesStream, EscalationPoliciesStream])
+
+    with responses.RequestsMock() as rsps:
+        for resource in ('services', 'escalation_policies'):
+            rsps.add(responses.GET, f"https://api.pagerduty.com/{resource}",
+                     json={resource: [{"id": f"{resource}-{i}"} for i in range(50)], "more": False})
+        sync(config=config, catalog=catalog, state=state)
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    for resource in ('services', 'escalation_policies'):
+        records = [m['record']['id'] for m in messages if m['type'] == 'RECORD' and m['stream'] == resource]
+        assert records == [f"{resource}-{i}" for i in range(50)]
+        assert [m for m in messages if m['type'] == 'SCHEMA' and m['stream'] == resource]
+    assert messages[-1]['type'] == 'STATE'
+
+
+def test_deselected_fields_are_pruned_and_not_fetched(config, state, capsys, build_catalog):
+    config['streams']['incidents']['until'] = '2019-08-02T00:00:00Z'
+    config['since'] = '2019-08-01T00:00:00Z'
+    catalog = build_catalog(config, [IncidentsStream])
+    entry = catalog.get_stream('incidents')
+    metadata = singer.metadata.to_map(entry.metadata)
+    for field in ('alerts', 'summary', 'last_status_change_at'):
+        metadata = singer.metadata.write(metadata, ('properties', field), 'selected', False)
+    entry.metadata = singer.metadata.to_list(metadata)
+
+    incident = {"id": "P1", "summary": "Disk full", "status": "triggered", "last_status_change_at": "2019-08-01T12:00:00Z"}
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, "https://api.pagerduty.com/incidents", json={"incidents": [incident], "more": False})
+        rsps.add(responses.GET, "https://api.pagerduty.com/incidents/P1/log_entries", json={"log_entries": [{"id": "L1"}], "more": False})
+        sync(config=config, catalog=catalog, state=state)
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    schema, = [m['schema'] for m in messages if m['type'] == 'SCHEMA']
+    record, = [m['record'] for m in messages if m['type'] == 'RECORD']
+    assert 'alerts' not in schema['properties'] and 'summary' not in schema['properties']
+    assert record == {"id": "P1", "status": "triggered", "last_status_change_at": "2019-08-01T12:00:00.000000Z", "log_entries": [{"id": "L1"}]}
+
+
+def test_accounts_sync_in_parallel_with_tagged_records(config, state, capsys, build_catalog):
+    config['accounts'] = [{"name": "us", "token": "us-token"}, {"name": "eu", "token": "eu-token", "email": "eu@testing.com"}]
+    config['streams'] = {'notifications': {'until': '2019-11-02T00:00:00Z'}}
+    config['since'] = '2019-11-01T00:00:00Z'
+    catalog = build_catalog(config, [NotificationsStream])
+
+    def callback(request):
+        account = request.headers['Authorization'].split()[-1].split('-')[0]
+        records = [{"id": "P1", "started_at": f"2019-11-01T{12 if account == 'us' else 18}:00:00Z"}]
+        return 200, {}, json.dumps({"notifications": records, "more": False})
+
+    with responses.RequestsMock() as rsps:
+        rsps.add_callback(responses.GET, "https://api.pagerduty.com/notifications", callback=callback)
+        sync(config=config, catalog=catalog, state=state)
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    records = sorted((m['record'] for m in messages if m['type'] == 'RECORD'), key=lambda record: record['account'])
+    assert records == [{"id": "P1", "started_at": "2019-11-01T18:00:00.000000Z", "account": "eu"},
+                       {"id": "P1", "started_at": "2019-11-01T12:00:00.000000Z", "account": "us"}]
+    schema = next(m for m in messages if m['type'] == 'SCHEMA')
+    assert schema['key_properties'] == ['account', 'id']
+    assert state['bookmarks']['notifications:us']['started_at'] == '2019-11-01T12:00:00Z'
+    assert state['bookmarks']['notifications:eu']['started_at'] == '2019-11-01T18:00:00Z'
+
+
+def test_accounts_keep_oncalls_without_key_properties(config, state, capsys, build_catalog):
+    config['accounts'] = [{"name": "us", "token": "us-token"}, {"name": "eu", "token": "eu-token"}]
+    catalog = build_catalog(config, [OncallsStream])
+    assert OncallsStream.catalog_entry(dict(config, account='us'))['key_properties'] == []
+    oncalls = [{"user": {"id": "U1"}, "escalation_level": 1}, {"user": {"id": "U2"}, "escalation_level": 2}]
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, "https://api.pagerduty.com/oncalls", json={"oncalls": oncalls, "more": False})
+        sync(config=config, catalog=catalog, state=state)
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert all(m['key_properties'] == [] for m in messages if m['type'] == 'SCHEMA')
+    records = [m['record'] for m in messages if m['type'] == 'RECORD']
+    assert sorted((record['account'], record['user']['id']) for record in records) == [
+        ('eu', 'U1'), ('eu', 'U2'), ('us', 'U1'), ('us', 'U2')]
+
+
+def test_accounts_each_sync_stream_concurrency_streams(config, state, monkeypatch, build_catalog):
+    config['accounts'] = [{"name": "us", "token": "us-token"}, {"name": "eu", "token": "eu-token"}]
+    catalog = build_catalog(config, [ServicesStream, EscalationPoliciesStream, OncallsStream])
+    active: Counter = Counter()
+    peaks: Counter = Counter()
+    lock = threading.Lock()
+
+    def sync_stream(stream, track_currently_syncing=True):
+        with lock:
+            active[stream.account] += 1
+            peaks[stream.account] = max(peaks[stream.account], active[stream.account])
+            peaks['total'] = max(peaks['total'], sum(active.values()))
+        time.sleep(0.05)
+        with lock:
+            active[stream.account] -= 1
+
+    monkeypatch.setattr(tap_pagerduty, 'sync_stream', sync_stream)
+    sync(config=config, catalog=catalog, state=state)
+
+    assert peaks == {'us': 1, 'eu': 1, 'total': 2}